@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "adhd_assessment" ADD COLUMN     "instrument_version" TEXT NOT NULL DEFAULT 'v1';
+
+-- CreateIndex
+CREATE INDEX "adhd_assessment_instrument_version_id_idx" ON "adhd_assessment"("instrument_version", "id");
@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "adhd_assessment" ADD COLUMN     "domain_scores" JSONB;
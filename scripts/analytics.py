@@ -0,0 +1,152 @@
+"""Cohort analytics backed by running counters.
+
+Every stored assessment adds one to a small, fixed set of counters (risk level
+per age band, score per domain, answer value per question), kept separately
+for each questionnaire version. The store keeps them in its cohort_counters
+table, updated in the same transaction as the insert, so dashboards read a
+few hundred rows regardless of how many screenings exist.
+
+`recompute` rebuilds the counters by streaming stored records in chunks, for
+backfills or after the counter definitions change:
+
+    python analytics.py backfill --db assessments.db --instrument v1
+"""
+import argparse
+import asyncio
+import json
+
+from assessment_logic import INSTRUMENT, load_instrument
+from storage import PERSONAL_FIELDS, RISK_LEVELS, SQLiteAssessmentStore
+
+
+# (label, lowest age, highest age); the last band is open-ended
+AGE_BANDS = (
+    ("0-2", 0, 2),
+    ("3-5", 3, 5),
+    ("6-8", 6, 8),
+    ("9-12", 9, 12),
+    ("13+", 13, None),
+)
+
+ANSWER_LABELS = ("1", "2", "3", "4")
+UNANSWERED = "unanswered"
+OTHER = "other"
+
+SEPARATOR = "|"
+
+
+def age_band(age):
+    for label, low, high in AGE_BANDS:
+        if age >= low and (high is None or age <= high):
+            return label
+    return "unknown"
+
+
+def answer_label(response):
+    if not response:
+        return UNANSWERED
+    return response if response in ANSWER_LABELS else OTHER
+
+
+def counter_deltas(record):
+    """Counter increments for one API-shaped record (instrument, data, domain_scores, result).
+
+    Keys start with the record's questionnaire version; every question the
+    record was asked is in its data, answered or not.
+    """
+    version = record["instrument"]
+    data = record["data"]
+    deltas = {
+        SEPARATOR.join((version, "total")): 1,
+        SEPARATOR.join((version, "risk", age_band(data["age"]), record["result"]["overall_risk"])): 1,
+    }
+    for domain, score in record["domain_scores"].items():
+        deltas[SEPARATOR.join((version, "score", domain, str(score)))] = 1
+    for key, response in data.items():
+        if key not in PERSONAL_FIELDS:
+            deltas[SEPARATOR.join((version, "answer", key, answer_label(response)))] = 1
+    return deltas
+
+
+def summarize(counts, instrument=INSTRUMENT):
+    """Turn flat counter rows into the dashboard payload for one questionnaire version."""
+    prefix = instrument.version + SEPARATOR
+    counts = {key[len(prefix):]: count for key, count in counts.items() if key.startswith(prefix)}
+    risk_by_age_band = {label: dict.fromkeys(RISK_LEVELS, 0) for label, _, _ in AGE_BANDS}
+    domain_scores = {domain: {} for domain in instrument.domains}
+    answers = {key: dict.fromkeys((*ANSWER_LABELS, UNANSWERED, OTHER), 0) for key in instrument.question_keys}
+
+    for key, count in counts.items():
+        kind, _, rest = key.partition(SEPARATOR)
+        if kind == "risk":
+            band, _, risk = rest.partition(SEPARATOR)
+            risk_by_age_band.setdefault(band, dict.fromkeys(RISK_LEVELS, 0))[risk] = count
+        elif kind == "score":
+            domain, _, score = rest.partition(SEPARATOR)
+            domain_scores.setdefault(domain, {})[int(score)] = count
+        elif kind == "answer":
+            question, _, label = rest.partition(SEPARATOR)
+            answers.setdefault(question, {})[label] = count
+
+    return {
+        "instrument": instrument.version,
+        "total_assessments": counts.get("total", 0),
+        "risk_by_age_band": risk_by_age_band,
+        "risk_distribution": {
+            risk: sum(band[risk] for band in risk_by_age_band.values()) for risk in RISK_LEVELS
+        },
+        "domain_score_histograms": {
+            domain: dict(sorted(histogram.items())) for domain, histogram in domain_scores.items()
+        },
+        "answer_frequencies": answers,
+    }
+
+
+async def recompute(store, chunk_size=5000):
+    """Rebuild the running counters from stored records and swap them in atomically.
+
+    Records are streamed chunk_size at a time up to a high-water id captured at
+    the start; the store adds anything inserted after that mark inside the
+    final write transaction, so concurrent submissions are neither lost nor
+    double counted. Returns the number of records streamed.
+    """
+    high_water_id = await store.max_id()
+    counts = {}
+    streamed = 0
+    async for record in store.iter_records(
+        {"until_id": high_water_id}, ("instrument", "data", "domain_scores", "result"), chunk_size=chunk_size
+    ):
+        for key, delta in counter_deltas(record).items():
+            counts[key] = counts.get(key, 0) + delta
+        streamed += 1
+    await store.replace_counters(counts, high_water_id)
+    return streamed
+
+
+async def backfill(db_path, chunk_size, instrument):
+    store = SQLiteAssessmentStore(db_path, counters=counter_deltas)
+    await store.open()
+    try:
+        streamed = await recompute(store, chunk_size)
+        return streamed, summarize(await store.read_counters(), instrument)
+    finally:
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cohort analytics maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="recompute running counters from stored assessments")
+    backfill_parser.add_argument("--db", default="assessments.db")
+    backfill_parser.add_argument("--chunk-size", type=int, default=5000)
+    backfill_parser.add_argument("--instrument", default=INSTRUMENT.version,
+                                 help="questionnaire version whose risk distribution is printed")
+    args = parser.parse_args()
+
+    streamed, summary = asyncio.run(backfill(args.db, args.chunk_size, load_instrument(args.instrument)))
+    print(f"Recomputed counters from {streamed} assessments (all versions)")
+    print(f"{args.instrument}:", json.dumps(summary["risk_distribution"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
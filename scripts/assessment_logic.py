@@ -1,164 +1,471 @@
-class DevelopmentalScreeningBot:
-    def __init__(self):
-        self.questions = {
-            # Behavioral (Autism Spectrum)
-            "eye_contact": {"question": "During a conversation, does your child naturally make and hold eye contact without you reminding them?", "domain": "Behavioral", "weight": -1},
-            "literal_understanding": {"question": "Does your child take things very literally and have trouble understanding jokes, sarcasm, or phrases like 'break a leg'?", "domain": "Behavioral", "weight": 1},
-            "repetitive_behaviors": {"question": "When excited or upset, does your child repeat body movements like flapping their hands, rocking, or spinning?", "domain": "Behavioral", "weight": 1},
-            "intense_interests": {"question": "Does your child become extremely focused on one specific topic (e.g., dinosaurs, trains, a specific video game) and talk about it constantly?", "domain": "Behavioral", "weight": 1},
-            "change_upset": {"question": "Does your child get very upset by small changes, like a different brand of cereal or taking a new route to school?", "domain": "Behavioral", "weight": 1},
-            "social_difficulty": {"question": "Does your child struggle to make friends their own age and prefer to play alone or interact much more with adults?", "domain": "Behavioral", "weight": 1},
-
-            # Cognitive/Attention (ADHD)
-            "seated_difficulty": {"question": "Does your child have great difficulty remaining seated during meals, homework, or in classroom settings?", "domain": "Cognitive/Attention", "weight": 1},
-            "forgetful": {"question": "Is your child unusually forgetful in daily activities, often losing track of toys, homework, jackets, or water bottles?", "domain": "Cognitive/Attention", "weight": 1},
-            "sidetracked": {"question": "Is your child easily sidetracked by background noises or things they see out the window, making it hard to finish tasks?", "domain": "Cognitive/Attention", "weight": 1},
-            "blurting": {"question": "Does your child frequently blurt out answers before questions are finished or have trouble waiting for their turn in games?", "domain": "Cognitive/Attention", "weight": 1},
-            "task_avoidance": {"question": "Does your child avoid or strongly dislike tasks that require sustained mental effort, like homework or lengthy puzzles?", "domain": "Cognitive/Attention", "weight": 1},
-            "constant_motion": {"question": "Would you describe your child as constantly 'on the go,' as if driven by a motor, often running or climbing in inappropriate situations?", "domain": "Cognitive/Attention", "weight": 1},
-
-            # Motor Skills (Cerebral Palsy / Dyspraxia)
-            "clumsy": {"question": "Compared to other children the same age, does your child seem unusually clumsy, frequently tripping or bumping into things?", "domain": "Motor Skills", "weight": 1},
-            "fine_motor_tasks": {"question": "Does your child struggle with fine motor tasks like buttoning a shirt, using a fork and spoon correctly, or writing neatly?", "domain": "Motor Skills", "weight": 1},
-            "muscle_tone": {"question": "When you pick your child up, do their muscles feel unusually stiff and rigid, or unusually floppy and loose?", "domain": "Motor Skills", "weight": 1},
-            "hand_preference": {"question": "Before the age of 4, does your child strongly prefer using one hand for all tasks like drawing and eating?", "domain": "Motor Skills", "weight": 1},
-            "coordination_issues": {"question": "Does your child have trouble with coordinated movements like jumping with both feet, skipping, or catching a ball with two hands?", "domain": "Motor Skills", "weight": 1},
-            "crawling_abnormal": {"question": "Did your child have an unusual way of crawling (e.g., using one leg, scooting on their bottom) or skip crawling altogether?", "domain": "Motor Skills", "weight": 1},
-
-            # Language/Academic (Dyslexia / Language Disorder)
-            "letter_mixing": {"question": "Does your child consistently mix up letters that look similar (like 'b' and 'd') or numbers (like '6' and '9')?", "domain": "Language/Academic", "weight": 1},
-            "phonics_struggle": {"question": "When reading, does your child struggle to 'sound out' a new word, even after being shown the phonics rules multiple times?", "domain": "Language/Academic", "weight": 1},
-            "reading_avoidance": {"question": "Does your child read slowly, guess words based on the first letter, or avoid reading for fun because it is so difficult?", "domain": "Language/Academic", "weight": 1},
-            "multi_step_instructions": {"question": "Does your child have trouble remembering and following multi-step instructions, like 'Please go upstairs, get your shoes, and put them by the door'?", "domain": "Language/Academic", "weight": 1},
-            "word_finding": {"question": "Does your child frequently mispronounce long words (e.g., saying 'aminal' for 'animal') or have trouble finding the right word when speaking?", "domain": "Language/Academic", "weight": 1},
-            "verbal_writing_gap": {"question": "Is there a major difference between your child's verbal skills and their writing? (e.g., They can tell a great story but can't write it down).", "domain": "Language/Academic", "weight": 1},
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from operator import attrgetter
+from types import MappingProxyType
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+# Parsed values for the canonical answer strings, to skip int() on the common case
+ANSWER_VALUES = {"1": 1, "2": 2, "3": 3, "4": 4}
+
+# Parsed answers at or beyond this magnitude are skipped like unparseable ones, so
+# the int64 batch path cannot overflow and scores exactly what the per-row path does
+MAX_ANSWER_MAGNITUDE = 2 ** 31
+
+# Versioned questionnaire definitions (JSON, or YAML when PyYAML is installed)
+QUESTIONNAIRE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questionnaires")
+DEFAULT_VERSION = os.environ.get("ASSESSMENT_INSTRUMENT_VERSION", "v1")
+
+# Compiled instruments kept in memory; least recently used versions are evicted
+INSTRUMENT_CACHE_SIZE = 8
+
+# Bounded cache of results per distinct answer vector; size 0 disables it
+RESULT_CACHE_SIZE = int(os.environ.get("ASSESSMENT_RESULT_CACHE_SIZE", "4096"))
+RESULT_CACHE_TTL = float(os.environ.get("ASSESSMENT_RESULT_CACHE_TTL", "3600"))
+
+LOW_RISK_RECOMMENDATIONS = (
+    "Continue regular well-child check-ups",
+    "Provide age-appropriate learning opportunities",
+    "Monitor developmental milestones",
+    "Consult your pediatrician if you have any concerns"
+)
+
+HIGH_RISK_RECOMMENDATIONS = (
+    "Schedule comprehensive developmental evaluation",
+    "Consult with pediatrician and developmental specialists",
+    "Consider speech therapy, occupational therapy, or behavioral interventions",
+    "Contact early intervention services or school district for support"
+)
+
+
+class AssessmentTemplate(NamedTuple):
+    """Immutable result payload shared by every submission with the same flagged domains."""
+    overall_risk: str
+    flagged_domains: tuple
+    message: str
+    detailed_message: str
+    recommendations: tuple
+
+
+def _build_template(flagged_domains, domain_info):
+    high_risk_count = len(flagged_domains)
+
+    if high_risk_count == 0:
+        return AssessmentTemplate(
+            overall_risk="Low",
+            flagged_domains=(),
+            message="Your responses suggest typical developmental patterns.",
+            detailed_message="Based on your screening responses, your child appears to be developing within typical ranges across all assessed areas. Continue monitoring their development and providing supportive learning opportunities.",
+            recommendations=LOW_RISK_RECOMMENDATIONS,
+        )
+    elif high_risk_count == 1:
+        flagged_domain = flagged_domains[0]
+        return AssessmentTemplate(
+            overall_risk="Moderate",
+            flagged_domains=flagged_domains,
+            message=f"Potential concerns identified in the {flagged_domain} domain.",
+            detailed_message="Your screening indicates some areas that may benefit from further evaluation. This does not necessarily indicate a developmental disorder, but early intervention can be very helpful." + domain_info.get(flagged_domain, ""),
+            recommendations=(
+                "Discuss results with your child's pediatrician",
+                "Consider developmental screening with a specialist",
+                f"Monitor the {flagged_domain.lower()} area closely",
+                "Seek early intervention services if available in your area"
+            ),
+        )
+    else:
+        return AssessmentTemplate(
+            overall_risk="High",
+            flagged_domains=flagged_domains,
+            message=f"Potential concerns identified in {high_risk_count} developmental domains.",
+            detailed_message="Your screening suggests multiple areas that may warrant professional evaluation. While this tool is not diagnostic, these results indicate that consultation with developmental specialists would be beneficial.",
+            recommendations=HIGH_RISK_RECOMMENDATIONS,
+        )
+
+
+class ScreeningInstrument:
+    """Question set, thresholds and result templates compiled once into lookup tables.
+
+    Domains are addressed by integer index (position in `domains`). A set of
+    flagged domains is a bitmask with bit i set when domain i is flagged, so
+    `templates[mask]` is the result payload for that combination.
+    """
+
+    def __init__(self, version, questions, thresholds, domains, domain_info=None):
+        self.version = version
+        self.questions = MappingProxyType(dict(questions))
+        self.domains = tuple(domains)
+        self.question_keys = tuple(self.questions)
+        domain_info = domain_info or {}
+
+        # Changes whenever questions, thresholds or result text change; used to invalidate cached results
+        self.fingerprint = hashlib.sha1(json.dumps(
+            [version, dict(questions), dict(thresholds), list(domains), domain_info], sort_keys=True
+        ).encode("utf-8")).hexdigest()
+
+        # Pulls every answer off a request object in one C-level call
+        self._answer_getter = attrgetter(*self.question_keys)
+
+        # Per-question (domain index, weight) for the single-submission path
+        self.question_table = MappingProxyType({
+            key: (self.domains.index(spec["domain"]), spec["weight"])
+            for key, spec in self.questions.items()
+        })
+        self.question_index = MappingProxyType({key: i for i, key in enumerate(self.question_keys)})
+
+        # Domains without a threshold are always flagged (score >= 0)
+        self.threshold_list = tuple(thresholds.get(domain, 0) for domain in self.domains)
+        self.thresholds = np.array(self.threshold_list, dtype=np.int64)
+        self.thresholds.flags.writeable = False
+
+        # Dense scoring tables for the batch path: rows follow question_keys, columns follow domains.
+        # Reverse scoring: (5 - value) * |weight| == value * weight + 5 * |weight|
+        weight_matrix = np.zeros((len(self.question_keys), len(self.domains)), dtype=np.int64)
+        offset_matrix = np.zeros_like(weight_matrix)
+        for i, key in enumerate(self.question_keys):
+            d, weight = self.question_table[key]
+            weight_matrix[i, d] = weight
+            if weight < 0:
+                offset_matrix[i, d] = 5 * abs(weight)
+        weight_matrix.flags.writeable = False
+        offset_matrix.flags.writeable = False
+        self.weight_matrix = weight_matrix
+        self.offset_matrix = offset_matrix
+        self.mask_bits = np.array([1 << d for d in range(len(self.domains))], dtype=np.int64)
+
+        self.templates = tuple(
+            _build_template(tuple(domain for d, domain in enumerate(self.domains) if mask & (1 << d)), domain_info)
+            for mask in range(1 << len(self.domains))
+        )
+
+    @classmethod
+    def from_definition(cls, definition):
+        """Compile a parsed questionnaire definition (see questionnaires/v1.json)."""
+        domains = definition["domains"]
+        questions = {}
+        for spec in definition["questions"]:
+            if spec["domain"] not in domains:
+                raise ValueError(f"Question {spec['key']!r} uses unknown domain {spec['domain']!r}")
+            questions[spec["key"]] = {"question": spec["question"], "domain": spec["domain"], "weight": spec.get("weight", 1)}
+
+        return cls(
+            definition["version"],
+            questions,
+            definition.get("thresholds", {}),
+            domains,
+            definition.get("domain_info"),
+        )
+
+    def extract_responses(self, obj):
+        """Map question keys to the matching attributes of a request object."""
+        values = self._answer_getter(obj)
+        if len(self.question_keys) == 1:
+            values = (values,)
+        return dict(zip(self.question_keys, values))
+
+    def flag_mask(self, score_list):
+        """Return the flagged-domain bitmask for scores given in domain order."""
+        mask = 0
+        for d, (score, threshold) in enumerate(zip(score_list, self.threshold_list)):
+            if score >= threshold:
+                mask |= 1 << d
+        return mask
+
+    def flag_masks(self, scores):
+        """Vectorized flag_mask for an (N, domains) score array."""
+        return (scores >= self.thresholds) @ self.mask_bits
+
+
+def _definition_path(version):
+    for extension in (".json", ".yaml", ".yml"):
+        path = os.path.join(QUESTIONNAIRE_DIR, version + extension)
+        if os.path.isfile(path):
+            return path
+    raise LookupError(f"Unknown questionnaire version: {version}")
+
+
+@lru_cache(maxsize=INSTRUMENT_CACHE_SIZE)
+def _compile_instrument(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            definition = json.load(f)
+        elif yaml is None:
+            raise RuntimeError(f"PyYAML is required to load {path}")
+        else:
+            definition = yaml.safe_load(f)
+    return ScreeningInstrument.from_definition(definition)
+
+
+def load_instrument(version=DEFAULT_VERSION):
+    """Return the compiled instrument for a questionnaire version.
+
+    Compiled instruments are cached by file and modification time, so an
+    edited definition is recompiled on the next call.
+    """
+    if os.sep in version or version.startswith("."):
+        raise LookupError(f"Unknown questionnaire version: {version}")
+    path = _definition_path(version)
+    return _compile_instrument(path, os.stat(path).st_mtime_ns)
+
+
+def available_versions():
+    return sorted({
+        os.path.splitext(name)[0]
+        for name in os.listdir(QUESTIONNAIRE_DIR)
+        if name.endswith((".json", ".yaml", ".yml"))
+    })
+
+
+INSTRUMENT = load_instrument()
+DOMAINS = INSTRUMENT.domains
+
+
+def _assessment_from_template(template, domain_scores):
+    return {
+        "overall_risk": template.overall_risk,
+        "domain_scores": domain_scores,
+        "flagged_domains": template.flagged_domains,
+        "message": template.message,
+        "detailed_message": template.detailed_message,
+        "recommendations": template.recommendations
+    }
+
+
+# Byte code per answer value for pack_answers; anything else is not cacheable
+ANSWER_CODES = {None: 0, "": 0, "1": 1, "2": 2, "3": 3, "4": 4}
+
+
+def pack_answers(instrument, responses):
+    """Pack an answer vector into one integer, one byte per question (0 = unanswered).
+
+    Returns None when any answer is not a canonical "1"-"4" or blank value;
+    those submissions are scored without the cache.
+    """
+    try:
+        codes = bytes(map(ANSWER_CODES.__getitem__, map(responses.get, instrument.question_keys)))
+    except (KeyError, TypeError):
+        return None
+    return int.from_bytes(codes, "big")
+
+
+class ResultCache:
+    """Thread-safe LRU cache with TTL mapping (instrument fingerprint, packed answers) to results.
+
+    Entries hold the domain score tuple and the flagged-domain bitmask, which is
+    all that is needed to rebuild a result from the instrument's templates. The
+    fingerprint changes whenever a definition file does, so results for an
+    edited instrument are never served from the old definition's entries; those
+    simply age out of the LRU.
+    """
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, instrument, packed):
+        key = (instrument.fingerprint, packed)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, instrument, packed, value):
+        key = (instrument.fingerprint, packed)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
         }
 
+
+RESULT_CACHE = ResultCache()
+
+
+class DevelopmentalScreeningBot:
+    def __init__(self, instrument=INSTRUMENT, cache=RESULT_CACHE):
+        self.instrument = instrument
+        self.cache = cache if cache is not None and cache.maxsize > 0 else None
+        self.questions = instrument.questions
+        self.domains = list(instrument.domains)
+        self.question_keys = list(instrument.question_keys)
+
     def calculate_domain_scores(self, responses):
         """Calculate scores for each developmental domain."""
-        domain_scores = {
-            "Behavioral": 0,
-            "Cognitive/Attention": 0,
-            "Motor Skills": 0,
-            "Language/Academic": 0
-        }
+        scores = [0] * len(self.domains)
+        question_table = self.instrument.question_table
 
         for question_key, response in responses.items():
-            if question_key not in self.questions or not response:
+            spec = question_table.get(question_key)
+            if spec is None or not response:
                 continue
 
-            try:
-                response_value = int(response)
-            except (ValueError, TypeError):
-                continue
+            response_value = ANSWER_VALUES.get(response) if type(response) is str else None
+            if response_value is None:
+                try:
+                    response_value = int(response)
+                except (ValueError, TypeError):
+                    continue
+                if abs(response_value) >= MAX_ANSWER_MAGNITUDE:
+                    continue
 
-            question_spec = self.questions[question_key]
-            domain = question_spec["domain"]
-            weight = question_spec["weight"]
+            domain_index, weight = spec
 
             # Handle reverse scoring for questions like eye contact
             if weight < 0:
                 # For negative weight: "Never" (1) becomes 4, "Always" (4) becomes 1
-                points = (5 - response_value) * abs(weight)
+                scores[domain_index] += (5 - response_value) * abs(weight)
             else:
-                points = response_value * weight
+                scores[domain_index] += response_value * weight
 
-            domain_scores[domain] += points
+        return dict(zip(self.domains, scores))
 
-        return domain_scores
+    def encode_responses(self, submissions):
+        """Encode a list of response dicts as (values, answered) arrays of shape (N, questions)."""
+        width = len(self.question_keys)
+        # Fill flat Python lists and convert once; per-element ndarray writes are far slower
+        values = [0] * (len(submissions) * width)
+        answered = [False] * len(values)
+        question_index = dict(self.instrument.question_index)
 
-    def generate_assessment(self, domain_scores, child_age):
-        """Generate assessment results based on domain scores."""
-        # Risk thresholds (conceptual - not clinically validated)
-        risk_thresholds = {
-            "Behavioral": 14,
-            "Cognitive/Attention": 16,
-            "Motor Skills": 14,
-            "Language/Academic": 16
-        }
+        for row, responses in enumerate(submissions):
+            base = row * width
+            for question_key, response in responses.items():
+                col = question_index.get(question_key)
+                if col is None or not response:
+                    continue
 
-        flagged_domains = []
-        high_risk_count = 0
+                value = ANSWER_VALUES.get(response) if type(response) is str else None
+                if value is None:
+                    try:
+                        value = int(response)
+                    except (ValueError, TypeError):
+                        continue
+                    if abs(value) >= MAX_ANSWER_MAGNITUDE:
+                        continue
+                values[base + col] = value
+                answered[base + col] = True
 
-        for domain, score in domain_scores.items():
-            threshold = risk_thresholds.get(domain, 0)
-            if score >= threshold:
-                flagged_domains.append(domain)
-                high_risk_count += 1
-
-        # Determine overall risk level
-        if high_risk_count == 0:
-            overall_risk = "Low"
-            message = "Your responses suggest typical developmental patterns."
-            detailed_message = "Based on your screening responses, your child appears to be developing within typical ranges across all assessed areas. Continue monitoring their development and providing supportive learning opportunities."
-            recommendations = [
-                "Continue regular well-child check-ups",
-                "Provide age-appropriate learning opportunities",
-                "Monitor developmental milestones",
-                "Consult your pediatrician if you have any concerns"
-            ]
-
-            return {
-                "overall_risk": overall_risk,
-                "domain_scores": domain_scores,
-                "flagged_domains": flagged_domains,
-                "message": message,
-                "detailed_message": detailed_message,
-                "recommendations": recommendations
-            }
-        elif high_risk_count == 1:
-            overall_risk = "Moderate"
-            flagged_domain = flagged_domains[0]
-            message = f"Potential concerns identified in the {flagged_domain} domain."
-            detailed_message = f"Your screening indicates some areas that may benefit from further evaluation. This does not necessarily indicate a developmental disorder, but early intervention can be very helpful."
-
-            # Add specific informative content for the flagged domain
-            domain_info = ""
-            if flagged_domain == "Behavioral":
-                domain_info = "\n\n**Informative Content: Behavioral Domain**\nChallenges in social communication and interaction, alongside restricted and repetitive behaviors, are core features of Autism Spectrum Disorder (ASD). These are not simply preferences but represent neurological differences in how the brain processes social information and environmental stimuli. An elevated score here suggests a child may find social situations confusing or overwhelming and may rely on routines and repetitive behaviors to create predictability. Early intervention, such as speech and occupational therapy, can be profoundly beneficial."
-            elif flagged_domain == "Cognitive/Attention":
-                domain_info = "\n\n**Informative Content: Cognitive/Attention Domain**\nADHD is a neurodevelopmental disorder of executive function—the cognitive skills that help us plan, focus, and execute tasks. A child with ADHD isn't simply 'being difficult'; their brain is managing a constant stream of stimuli and impulses differently. An elevated score may indicate challenges with self-regulation, working memory, and cognitive flexibility. Strategies like behavioral therapy, environmental modifications, and professional guidance can be effective parts of a management plan."
-            elif flagged_domain == "Motor Skills":
-                domain_info = "\n\n**Informative Content: Motor Skills Domain**\nMotor challenges can stem from differences in muscle tone, coordination (dyspraxia), or neurological conditions. These are not due to a lack of practice but to differences in how the brain sends messages to the muscles. An elevated score suggests a child may struggle with the physical coordination required for everyday tasks and playground activities. An evaluation by an occupational or physical therapist is essential to identify the root cause and develop a targeted therapy plan."
-            elif flagged_domain == "Language/Academic":
-                domain_info = "\n\n**Informative Content: Language/Academic Domain**\nDifficulties here often point to a Specific Learning Disorder like Dyslexia (reading) or a Language Disorder. Dyslexia is not a problem with intelligence; it is a difficulty with phonological processing—the ability to identify and manipulate the sounds in language. This makes connecting letters to their sounds challenging. An elevated score suggests a child may be struggling to crack the linguistic code. A formal psychoeducational assessment is key to identifying the specific profile and securing effective interventions and accommodations."
-
-            detailed_message += domain_info
-
-            recommendations = [
-                "Discuss results with your child's pediatrician",
-                "Consider developmental screening with a specialist",
-                f"Monitor the {flagged_domain.lower()} area closely",
-                "Seek early intervention services if available in your area"
-            ]
-
-            return {
-                "overall_risk": overall_risk,
-                "domain_scores": domain_scores,
-                "flagged_domains": flagged_domains,
-                "message": message,
-                "detailed_message": detailed_message,
-                "recommendations": recommendations
-            }
+        shape = (len(submissions), width)
+        return np.array(values, dtype=np.int64).reshape(shape), np.array(answered, dtype=bool).reshape(shape)
+
+    def calculate_domain_scores_batch(self, submissions):
+        """Calculate domain scores for many submissions at once.
+
+        `submissions` is either a list of response dicts (same format as
+        calculate_domain_scores) or a 2-D integer array of shape (N, questions)
+        in self.question_keys order, where 0 marks an unanswered question.
+        Returns an int64 array of shape (N, domains) in self.domains order.
+        """
+        if isinstance(submissions, np.ndarray):
+            values = submissions.astype(np.int64, copy=False)
+            if values.ndim != 2 or values.shape[1] != len(self.question_keys):
+                raise ValueError(f"expected an array of shape (N, {len(self.question_keys)}), got {values.shape}")
+            answered = values != 0
         else:
-            overall_risk = "High"
-            message = f"Potential concerns identified in {high_risk_count} developmental domains."
-            detailed_message = "Your screening suggests multiple areas that may warrant professional evaluation. While this tool is not diagnostic, these results indicate that consultation with developmental specialists would be beneficial."
-            recommendations = [
-                "Schedule comprehensive developmental evaluation",
-                "Consult with pediatrician and developmental specialists",
-                "Consider speech therapy, occupational therapy, or behavioral interventions",
-                "Contact early intervention services or school district for support"
-            ]
-
-            return {
-            "overall_risk": overall_risk,
-            "domain_scores": domain_scores,
-            "flagged_domains": flagged_domains,
-            "message": message,
-            "detailed_message": detailed_message,
-            "recommendations": recommendations
-        }
+            values, answered = self.encode_responses(submissions)
+
+        return values @ self.instrument.weight_matrix + answered.astype(np.int64) @ self.instrument.offset_matrix
+
+    def domain_scores_to_dicts(self, scores):
+        """Convert a batch score array back to the per-row dict format."""
+        return [dict(zip(self.domains, map(int, row))) for row in scores]
+
+    def generate_assessment(self, domain_scores, child_age):
+        """Generate assessment results based on domain scores.
+
+        The returned dict references the instrument's shared, immutable result
+        template for the flagged-domain combination; only domain_scores is per call.
+        """
+        score_list = [domain_scores.get(domain, 0) for domain in self.domains]
+        template = self.instrument.templates[self.instrument.flag_mask(score_list)]
+        return _assessment_from_template(template, domain_scores)
+
+    def assess(self, responses, child_age):
+        """Score responses and generate the result, going through the result cache when possible.
+
+        Returns (domain_scores, assessment) exactly as calculate_domain_scores
+        followed by generate_assessment would.
+        """
+        domain_scores, mask = self.score(responses)
+        return domain_scores, self.assessment_for_mask(domain_scores, mask)
+
+    def score(self, responses):
+        """Return (domain_scores, flagged-domain mask), served from the result cache when possible."""
+        packed = pack_answers(self.instrument, responses) if self.cache is not None else None
+        if packed is None:
+            if self.cache is not None:
+                self.cache.record_bypass()
+            domain_scores = self.calculate_domain_scores(responses)
+            return domain_scores, self.instrument.flag_mask(list(domain_scores.values()))
+
+        cached = self.cache.get(self.instrument, packed)
+        if cached is None:
+            domain_scores = self.calculate_domain_scores(responses)
+            score_list = tuple(domain_scores.values())
+            mask = self.instrument.flag_mask(score_list)
+            self.cache.put(self.instrument, packed, (score_list, mask))
+            return domain_scores, mask
+
+        score_list, mask = cached
+        return dict(zip(self.domains, score_list)), mask
+
+    def assessment_for_mask(self, domain_scores, mask):
+        """The result for scores whose flagged-domain mask is already known (see score)."""
+        return _assessment_from_template(self.instrument.templates[mask], domain_scores)
+
+    def generate_assessments_batch(self, scores):
+        """Generate assessment results for an (N, domains) array from calculate_domain_scores_batch."""
+        templates = self.instrument.templates
+        return [
+            _assessment_from_template(templates[mask], domain_scores)
+            for mask, domain_scores in zip(self.instrument.flag_masks(scores).tolist(), self.domain_scores_to_dicts(scores))
+        ]
 
     # Legacy method for backward compatibility
     def calculate_score(self, responses):
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+
+
+LOGGER_NAME = "assessment"
+
+# Structured fields that identify a parent or child and never leave the process unredacted
+PII_FIELDS = {"name", "parent_name", "full_name", "email", "phone"}
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+REDACTED = "[redacted]"
+
+# Maximum number of records written with one write call
+MAX_BATCH = 512
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def redact_record(record):
+    """Strip PII from a record's structured fields and message, in place."""
+    fields = getattr(record, "fields", None)
+    if fields:
+        record.fields = {key: REDACTED if key in PII_FIELDS else value for key, value in fields.items()}
+    record.msg = EMAIL_PATTERN.sub(REDACTED, record.getMessage())
+    record.args = None
+    return record
+
+
+def format_json(record):
+    entry = {
+        "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+        "level": record.levelname,
+        "logger": record.name,
+        "message": record.getMessage(),
+    }
+    fields = getattr(record, "fields", None)
+    if fields:
+        entry.update(fields)
+    return json.dumps(entry, default=str) + "\n"
+
+
+def format_text(record):
+    line = f"{datetime.fromtimestamp(record.created).isoformat()} {record.levelname} {record.getMessage()}"
+    fields = getattr(record, "fields", None)
+    if fields:
+        line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+    return line + "\n"
+
+
+class Sink:
+    """Destination for formatted log batches. Each batch is written with a single write call."""
+
+    def __init__(self, formatter=format_text):
+        self.formatter = formatter
+
+    def write_batch(self, records):
+        self.write("".join(self.formatter(record) for record in records).encode("utf-8"))
+
+    def write(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class StreamSink(Sink):
+    def __init__(self, stream=None, formatter=format_text):
+        super().__init__(formatter)
+        self.stream = stream or sys.stdout
+
+    def write(self, data):
+        if hasattr(self.stream, "buffer"):
+            self.stream.flush()
+            self.stream.buffer.write(data)
+            self.stream.buffer.flush()
+        else:
+            self.stream.write(data.decode("utf-8"))
+            self.stream.flush()
+
+
+class FileSink(Sink):
+    """Append-only file opened unbuffered, so one batch is one write syscall."""
+
+    def __init__(self, path, formatter=format_text):
+        super().__init__(formatter)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab", buffering=0)
+
+    def write(self, data):
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonLinesSink(FileSink):
+    def __init__(self, path):
+        super().__init__(path, formatter=format_json)
+
+
+class RotatingFileSink(FileSink):
+    """FileSink that rolls over to path.1 ... path.N once max_bytes is reached."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, formatter=format_text):
+        super().__init__(path, formatter)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._size = os.path.getsize(path)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab", buffering=0)
+        self._size = 0
+
+    def write(self, data):
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._size += len(data)
+
+
+class BatchingListener:
+    """Background thread that drains the log queue and writes records to sinks in batches.
+
+    The request path only pays for a queue put; redaction, formatting and I/O
+    happen on this thread. Whatever has accumulated in the queue since the last
+    write is flushed as one batch per sink.
+    """
+
+    _sentinel = None
+
+    def __init__(self, log_queue, sinks, redact=True, max_batch=MAX_BATCH):
+        self.queue = log_queue
+        self.sinks = sinks
+        self.redact = redact
+        self.max_batch = max_batch
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="assessment-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+        for sink in self.sinks:
+            sink.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self._sentinel in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._sentinel]
+            if not batch:
+                continue
+
+            if self.redact:
+                batch = [redact_record(record) for record in batch]
+            for sink in self.sinks:
+                try:
+                    sink.write_batch(batch)
+                except Exception as e:
+                    sys.stderr.write(f"Failed to write {len(batch)} log records: {e}\n")
+
+
+def sinks_from_spec(spec):
+    """Build sinks from a comma-separated spec.
+
+    Entries: `stdout`, `stderr`, `file:<path>`, `jsonl:<path>`,
+    `rotating:<path>[:<max_bytes>[:<backup_count>]]`.
+    """
+    sinks = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, target = entry.partition(":")
+        if kind == "stdout":
+            sinks.append(StreamSink(sys.stdout))
+        elif kind == "stderr":
+            sinks.append(StreamSink(sys.stderr))
+        elif kind == "file":
+            sinks.append(FileSink(target))
+        elif kind == "jsonl":
+            sinks.append(JsonLinesSink(target))
+        elif kind == "rotating":
+            path, *options = target.split(":")
+            sinks.append(RotatingFileSink(path, *(int(option) for option in options)))
+        else:
+            raise ValueError(f"Unknown log sink: {entry}")
+    return sinks
+
+
+def start_logging(sinks=None, redact=None, level=logging.INFO):
+    """Route the assessment logger through a queue to a batching writer thread.
+
+    Defaults come from ASSESSMENT_LOG_SINKS (default "stdout") and
+    ASSESSMENT_LOG_REDACT (default on). Returns the listener; pass it to
+    stop_logging on shutdown.
+    """
+    if sinks is None:
+        sinks = sinks_from_spec(os.environ.get("ASSESSMENT_LOG_SINKS", "stdout"))
+    if redact is None:
+        redact = os.environ.get("ASSESSMENT_LOG_REDACT", "1") != "0"
+
+    log_queue = queue.SimpleQueue()
+    listener = BatchingListener(log_queue, sinks, redact=redact)
+    listener.start()
+
+    handler = QueueHandler(log_queue)
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return listener
+
+
+def stop_logging(listener):
+    """Flush pending records and detach the queue handler."""
+    logger.handlers = []
+    listener.stop()
@@ -1,10 +1,29 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, ValidationError, create_model
+from typing import Literal, Optional
+import asyncio
+import json
+from collections import Counter
+from functools import lru_cache
+import time
+import os
 import uvicorn
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from datetime import datetime
-from assessment_logic import DevelopmentalScreeningBot
+from audit_log import logger, start_logging, stop_logging
+import analytics
+import calibration
+import notifications
+import metrics
+from assessment_logic import DEFAULT_VERSION, INSTRUMENT, INSTRUMENT_CACHE_SIZE, RESULT_CACHE, DevelopmentalScreeningBot, available_versions, load_instrument
+from jobs import JobQueue, SQLiteJobBackend
+from storage import RECORD_FIELDS, SQLiteAssessmentStore, format_assessment_id, parse_assessment_id
 
 app = FastAPI(title="Health Assessment API")
 
@@ -17,44 +36,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request timing and per-phase histograms, exposed at /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Data models
-class DevelopmentalAssessment(BaseModel):
+class PersonalInfo(BaseModel):
     name: str  # Parent/Guardian name
     email: EmailStr
     age: int  # Child's age
     marital_status: str  # Relationship to child
 
-    # Behavioral Domain
-    eye_contact: Optional[str] = ""
-    literal_understanding: Optional[str] = ""
-    repetitive_behaviors: Optional[str] = ""
-    intense_interests: Optional[str] = ""
-    change_upset: Optional[str] = ""
-    social_difficulty: Optional[str] = ""
-
-    # Cognitive/Attention Domain
-    seated_difficulty: Optional[str] = ""
-    forgetful: Optional[str] = ""
-    sidetracked: Optional[str] = ""
-    blurting: Optional[str] = ""
-    task_avoidance: Optional[str] = ""
-    constant_motion: Optional[str] = ""
-
-    # Motor Skills Domain
-    clumsy: Optional[str] = ""
-    fine_motor_tasks: Optional[str] = ""
-    muscle_tone: Optional[str] = ""
-    hand_preference: Optional[str] = ""
-    coordination_issues: Optional[str] = ""
-    crawling_abnormal: Optional[str] = ""
-
-    # Language/Academic Domain
-    letter_mixing: Optional[str] = ""
-    phonics_struggle: Optional[str] = ""
-    reading_avoidance: Optional[str] = ""
-    multi_step_instructions: Optional[str] = ""
-    word_finding: Optional[str] = ""
-    verbal_writing_gap: Optional[str] = ""
+# A 1-4 rating, or blank for an unanswered question
+Answer = Literal["", "1", "2", "3", "4"]
+
+@lru_cache(maxsize=INSTRUMENT_CACHE_SIZE)
+def build_request_model(instrument):
+    """Request model for an instrument: personal info plus one optional answer field per question."""
+    answer_fields = {key: (Optional[Answer], "") for key in instrument.question_keys}
+    model_name = "DevelopmentalAssessment" if instrument is INSTRUMENT else f"DevelopmentalAssessment_{instrument.version}"
+    return create_model(model_name, __base__=PersonalInfo, **answer_fields)
+
+@lru_cache(maxsize=INSTRUMENT_CACHE_SIZE)
+def get_bot(instrument):
+    return DevelopmentalScreeningBot(instrument)
+
+def default_instrument():
+    """The default questionnaire as currently defined; an edited definition file is picked up on the next call."""
+    return load_instrument(DEFAULT_VERSION)
+
+DevelopmentalAssessment = build_request_model(INSTRUMENT)
+
+class VersionedDevelopmentalAssessment(PersonalInfo):
+    """Personal info plus one answer per question of the requested version (see GET /api/instruments/{version})."""
+    # Documents the body of the versioned submit endpoint, whose fields depend on the path
+    model_config = ConfigDict(extra="allow")
+    __pydantic_extra__: dict[str, Optional[Answer]]
 
 class AssessmentResponse(BaseModel):
     success: bool
@@ -66,108 +82,517 @@ class AssessmentResponse(BaseModel):
     recommendations: list
     assessment_id: Optional[str] = None
 
-# In-memory storage
-assessments_db = []
-assessment_bot = DevelopmentalScreeningBot()
+def assessment_response(result, assessment_id):
+    """AssessmentResponse content as a plain dict, in the model's field order."""
+    return {
+        "success": True,
+        "message": result["message"],
+        "overall_risk": result["overall_risk"],
+        "domain_scores": result["domain_scores"],
+        "flagged_domains": result["flagged_domains"],
+        "detailed_message": result["detailed_message"],
+        "recommendations": result["recommendations"],
+        "assessment_id": assessment_id,
+    }
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed; the output is the same compact JSON."""
+
+    def render(self, content):
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+async def parse_request_model(request, model):
+    """Validate the raw JSON body straight into `model`, without building an intermediate dict.
+
+    Errors are reported like FastAPI's own body validation (422, locations under "body").
+    """
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+
+def request_body_schema(model):
+    """OpenAPI request body for endpoints that parse the body themselves."""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": model.model_json_schema()}}}}
+
+class BulkSubmissionResult(BaseModel):
+    index: int
+    success: bool
+    assessment_id: Optional[str] = None
+    overall_risk: Optional[str] = None
+    flagged_domains: Optional[list] = None
+    errors: Optional[list] = None
+
+class BulkSubmissionResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    elapsed_seconds: float
+    records_per_second: float
+    results: list[BulkSubmissionResult]
+
+# Upper bound on records per bulk upload
+MAX_BULK_RECORDS = 10000
+
+class CalibrationRequest(BaseModel):
+    instrument: Optional[str] = None
+    # Candidate thresholds per domain, swept as a grid; domains left out keep their current threshold
+    grid: Optional[dict[str, list[int]]] = None
+    # Or explicit configurations, each one threshold per domain in instrument order
+    thresholds: Optional[list[list[int]]] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    sort: Literal["Low", "Moderate", "High", "reclassified"] = "reclassified"
+    limit: int = Field(100, ge=1, le=10000)
+
+# Upper bound on threshold configurations per calibration request
+MAX_CALIBRATION_CONFIGS = 200000
+
+# Persistent storage (SQLite in WAL mode, safe to share between worker processes)
+# Cohort counters are updated in the same transaction as each insert (see analytics.py)
+assessment_store = SQLiteAssessmentStore(os.environ.get("ASSESSMENT_DB_PATH", "assessments.db"), counters=analytics.counter_deltas)
+
+# Email reports and CRM sync run after the response, from a persistent queue shared by all workers
+job_queue = JobQueue(
+    SQLiteJobBackend(os.environ.get("ASSESSMENT_JOBS_DB_PATH", "jobs.db")),
+    concurrency=int(os.environ.get("ASSESSMENT_JOB_CONCURRENCY", 4)),
+    max_attempts=int(os.environ.get("ASSESSMENT_JOB_MAX_ATTEMPTS", 5)),
+)
+notifications.register(job_queue, assessment_store)
+
+RESULT_CACHE_EVENTS = ("hits", "misses", "bypassed", "evictions", "expirations")
+
+metrics.registry.register(metrics.CallbackMetric(
+    "assessment_result_cache_events_total", "Result cache lookups and evictions by event.", "counter", ("event",),
+    lambda: {(event,): value for event, value in RESULT_CACHE.stats().items() if event in RESULT_CACHE_EVENTS}))
+metrics.registry.register(metrics.CallbackMetric(
+    "assessment_result_cache_entries", "Entries currently held in the result cache.", "gauge", (),
+    lambda: {(): RESULT_CACHE.stats()["size"]}))
+metrics.registry.register(metrics.CallbackMetric(
+    "assessment_jobs_total", "Background jobs processed by this worker, by kind and outcome.", "counter",
+    ("kind", "outcome"), lambda: dict(job_queue.stats)))
+
+log_listener = None
+
+@app.on_event("startup")
+async def open_store():
+    global log_listener
+    log_listener = start_logging()
+    await assessment_store.open()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def close_store():
+    await job_queue.stop()
+    await assessment_store.close()
+    if log_listener is not None:
+        stop_logging(log_listener)
 
 @app.get("/")
 async def root():
     return {"message": "Health Assessment API is running"}
 
-@app.post("/api/submit-assessment", response_model=AssessmentResponse)
-async def submit_assessment(assessment: DevelopmentalAssessment):
+@app.post("/api/submit-assessment", response_model=AssessmentResponse, response_class=FastJSONResponse,
+          openapi_extra=request_body_schema(DevelopmentalAssessment))
+async def submit_assessment(request: Request):
+    instrument = default_instrument()
+    assessment = await parse_request_model(request, build_request_model(instrument))
+    return await process_assessment(assessment, get_bot(instrument))
+
+@app.get("/api/instruments")
+async def list_instruments():
+    return {"default_version": default_instrument().version, "versions": available_versions()}
+
+def get_instrument_or_404(version):
     try:
-        # Validate that at least one developmental question is answered
-        developmental_responses = {
-            # Behavioral
-            "eye_contact": assessment.eye_contact,
-            "literal_understanding": assessment.literal_understanding,
-            "repetitive_behaviors": assessment.repetitive_behaviors,
-            "intense_interests": assessment.intense_interests,
-            "change_upset": assessment.change_upset,
-            "social_difficulty": assessment.social_difficulty,
-
-            # Cognitive/Attention
-            "seated_difficulty": assessment.seated_difficulty,
-            "forgetful": assessment.forgetful,
-            "sidetracked": assessment.sidetracked,
-            "blurting": assessment.blurting,
-            "task_avoidance": assessment.task_avoidance,
-            "constant_motion": assessment.constant_motion,
-
-            # Motor Skills
-            "clumsy": assessment.clumsy,
-            "fine_motor_tasks": assessment.fine_motor_tasks,
-            "muscle_tone": assessment.muscle_tone,
-            "hand_preference": assessment.hand_preference,
-            "coordination_issues": assessment.coordination_issues,
-            "crawling_abnormal": assessment.crawling_abnormal,
-
-            # Language/Academic
-            "letter_mixing": assessment.letter_mixing,
-            "phonics_struggle": assessment.phonics_struggle,
-            "reading_avoidance": assessment.reading_avoidance,
-            "multi_step_instructions": assessment.multi_step_instructions,
-            "word_finding": assessment.word_finding,
-            "verbal_writing_gap": assessment.verbal_writing_gap,
-        }
+        return load_instrument(version)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"Unknown questionnaire version: {version}")
+
+@app.get("/api/instruments/{version}")
+async def get_instrument(version: str):
+    instrument = get_instrument_or_404(version)
+    return {
+        "version": instrument.version,
+        "domains": instrument.domains,
+        "thresholds": dict(zip(instrument.domains, instrument.threshold_list)),
+        "questions": [{"key": key, **spec} for key, spec in instrument.questions.items()],
+    }
 
-        answered_questions = [q for q in developmental_responses.values() if q and q.strip()]
+@app.post("/api/instruments/{version}/submit-assessment", response_model=AssessmentResponse,
+          response_class=FastJSONResponse, openapi_extra=request_body_schema(VersionedDevelopmentalAssessment))
+async def submit_versioned_assessment(version: str, request: Request):
+    """Submit an assessment scored against a specific questionnaire version."""
+    instrument = get_instrument_or_404(version)
+    assessment = await parse_request_model(request, build_request_model(instrument))
+    return await process_assessment(assessment, get_bot(instrument))
 
-        if len(answered_questions) == 0:
+async def process_assessment(assessment, bot):
+    try:
+        # The validated fields: personal info plus answers already constrained to "", "1"-"4" or None.
+        # Scoring skips keys that are not questions, so this serves as both the responses and the stored data.
+        fields = assessment.__dict__
+
+        # Validate that at least one developmental question is answered
+        if not any(map(fields.get, bot.question_keys)):
             raise HTTPException(
                 status_code=400,
                 detail="Please answer at least one developmental question"
             )
+        metrics.mark_phase("submit_assessment", "validation")
 
-        # Calculate domain scores using the assessment bot
-        domain_scores = assessment_bot.calculate_domain_scores(developmental_responses)
-        assessment_result = assessment_bot.generate_assessment(domain_scores, assessment.age)
+        # Calculate domain scores using the assessment bot (served from the result cache when possible)
+        domain_scores, flag_mask = bot.score(fields)
+        metrics.mark_phase("submit_assessment", "scoring")
+        assessment_result = bot.assessment_for_mask(domain_scores, flag_mask)
+        metrics.mark_phase("submit_assessment", "result")
 
         # Create assessment record
         assessment_record = {
-            "id": f"assessment_{len(assessments_db) + 1}",
             "timestamp": datetime.now().isoformat(),
-            "data": assessment.dict(),
+            "instrument": bot.instrument.version,
+            "data": fields,
             "domain_scores": domain_scores,
             "result": assessment_result
         }
 
         # Store assessment
-        assessments_db.append(assessment_record)
-
-        print(f"New developmental screening submitted:")
-        print(f"  Parent/Guardian: {assessment.name}")
-        print(f"  Child Age: {assessment.age}")
-        print(f"  Domain Scores: {domain_scores}")
-        print(f"  Overall Risk: {assessment_result['overall_risk']}")
-        print(f"  Flagged Domains: {assessment_result['flagged_domains']}")
-
-        return AssessmentResponse(
-            success=True,
-            message=assessment_result['message'],
-            overall_risk=assessment_result['overall_risk'],
-            domain_scores=assessment_result['domain_scores'],
-            flagged_domains=assessment_result['flagged_domains'],
-            detailed_message=assessment_result['detailed_message'],
-            recommendations=assessment_result['recommendations'],
-            assessment_id=assessment_record['id']
-        )
+        assessment_record["id"] = await assessment_store.add(assessment_record)
+        metrics.mark_phase("submit_assessment", "storage")
+        # The assessment is stored at this point, so the jobs are written in the background and a
+        # job backend failure is logged rather than failing (and inviting a retry of) the submission
+        job_queue.submit(notifications.submission_jobs(assessment_record["id"], bot.instrument.version))
+        metrics.mark_phase("submit_assessment", "enqueue")
+        metrics.record_assessment(assessment_result["overall_risk"], assessment_result["flagged_domains"])
+
+        logger.info("New developmental screening submitted", extra={"fields": {
+            "assessment_id": assessment_record["id"],
+            "parent_name": assessment.name,
+            "child_age": assessment.age,
+            "domain_scores": domain_scores,
+            "overall_risk": assessment_result["overall_risk"],
+            "flagged_domains": list(assessment_result["flagged_domains"]),
+        }})
+
+        return FastJSONResponse(assessment_response(assessment_result, assessment_record["id"]))
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error processing assessment: {str(e)}")
+    except Exception:
+        logger.exception("Error processing assessment")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def stored_timestamp(value):
+    """Format a filter bound like created_at is stored: naive local time, ISO 8601.
+
+    created_at is compared as a string, so a bound with a UTC offset is first
+    converted to local time; a naive bound is taken as local time already.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat()
+
+def parse_bulk_body(body, content_type):
+    """Split a bulk upload (JSON array or NDJSON) into raw items; unparseable NDJSON lines become exceptions."""
+    if content_type.startswith(("application/x-ndjson", "application/ndjson", "application/jsonl")):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(e)
+        return items
+
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of assessments")
+    return items
+
+@app.post("/api/submit-assessment/bulk", response_model=BulkSubmissionResponse)
+async def submit_assessments_bulk(request: Request):
+    """Validate, score and store a batch of assessments in one pass.
+
+    Accepts a JSON array or an NDJSON body (Content-Type: application/x-ndjson).
+    Invalid rows are reported individually and do not prevent the valid rows
+    from being stored; all valid rows are written in a single transaction.
+    """
+    started = time.perf_counter()
+    items = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+
+    if len(items) > MAX_BULK_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_RECORDS} assessments per request")
+
+    instrument = default_instrument()
+    request_model = build_request_model(instrument)
+    bot = get_bot(instrument)
+    results = [None] * len(items)
+    valid_indices = []
+    valid_assessments = []
+    valid_responses = []
+    assessment_ids = []
+    assessment_results = []
+
+    for index, item in enumerate(items):
+        if isinstance(item, Exception):
+            results[index] = BulkSubmissionResult(index=index, success=False, errors=[{"loc": [], "msg": f"Invalid JSON: {item}", "type": "json_invalid"}])
+            continue
+
+        try:
+            assessment = request_model.model_validate(item)
+        except ValidationError as e:
+            errors = [{"loc": list(error["loc"]), "msg": error["msg"], "type": error["type"]} for error in e.errors()]
+            results[index] = BulkSubmissionResult(index=index, success=False, errors=errors)
+            continue
+
+        responses = instrument.extract_responses(assessment)
+        if not any(value and value.strip() for value in responses.values()):
+            results[index] = BulkSubmissionResult(index=index, success=False, errors=[{"loc": [], "msg": "Please answer at least one developmental question", "type": "value_error"}])
+            continue
+
+        valid_indices.append(index)
+        valid_assessments.append(assessment)
+        valid_responses.append(responses)
+    metrics.mark_phase("submit_assessment_bulk", "validation")
+
+    if valid_assessments:
+        # Score every valid row with one vectorized pass
+        scores = bot.calculate_domain_scores_batch(valid_responses)
+        metrics.mark_phase("submit_assessment_bulk", "scoring")
+        assessment_results = bot.generate_assessments_batch(scores)
+        metrics.mark_phase("submit_assessment_bulk", "result")
+
+        timestamp = datetime.now().isoformat()
+        records = [
+            {
+                "timestamp": timestamp,
+                "instrument": instrument.version,
+                "data": assessment.model_dump(),
+                "domain_scores": assessment_result["domain_scores"],
+                "result": assessment_result
+            }
+            for assessment, assessment_result in zip(valid_assessments, assessment_results)
+        ]
+
+        try:
+            assessment_ids = await assessment_store.add_many(records)
+        except Exception:
+            logger.exception("Error storing bulk assessments", extra={"fields": {"records": len(records)}})
+            raise HTTPException(status_code=500, detail="Internal server error")
+        metrics.mark_phase("submit_assessment_bulk", "storage")
+
+        for index, assessment_id, assessment_result in zip(valid_indices, assessment_ids, assessment_results):
+            metrics.record_assessment(assessment_result["overall_risk"], assessment_result["flagged_domains"])
+            results[index] = BulkSubmissionResult(
+                index=index,
+                success=True,
+                assessment_id=assessment_id,
+                overall_risk=assessment_result["overall_risk"],
+                flagged_domains=assessment_result["flagged_domains"]
+            )
+
+    # One record per request; the stored rows get consecutive ids, so the range identifies them
+    logger.info("Bulk developmental screenings submitted", extra={"fields": {
+        "records": len(items),
+        "stored": len(assessment_ids),
+        "first_assessment_id": assessment_ids[0] if assessment_ids else None,
+        "last_assessment_id": assessment_ids[-1] if assessment_ids else None,
+        "instrument": instrument.version,
+        "overall_risk": dict(Counter(result["overall_risk"] for result in assessment_results)),
+    }})
+
+    elapsed = time.perf_counter() - started
+    return BulkSubmissionResponse(
+        total=len(items),
+        succeeded=len(valid_indices),
+        failed=len(items) - len(valid_indices),
+        elapsed_seconds=round(elapsed, 6),
+        records_per_second=round(len(items) / elapsed, 1) if elapsed > 0 else 0.0,
+        results=results
+    )
+
 @app.get("/api/assessments")
-async def get_assessments():
-    """Get all assessments (for admin purposes)"""
+async def get_assessments(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    instrument: Optional[str] = None,
+    risk: Optional[Literal["Low", "Moderate", "High"]] = None,
+    flagged_domain: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    min_age: Optional[int] = None,
+    max_age: Optional[int] = None,
+    fields: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    include_total: bool = False,
+):
+    """List assessments (for admin purposes).
+
+    Results are ordered by id and paginated with an opaque cursor: pass the
+    returned `next_cursor` back as `cursor` to get the next page. `instrument`
+    restricts the listing to one questionnaire version. `fields` is a
+    comma-separated projection of id, timestamp, instrument, data,
+    domain_scores, result.
+    With `format=ndjson` every matching record after `cursor` is streamed one
+    JSON object per line and `limit` is ignored. `total_assessments` counts
+    every matching record, which scans the whole filtered table, so it is only
+    computed with `include_total=true`.
+    """
+    if flagged_domain is not None:
+        # Domains of the selected questionnaire version, or of any version when none is selected
+        versions = [instrument] if instrument else available_versions()
+        if not any(flagged_domain in get_instrument_or_404(version).domains for version in versions):
+            raise HTTPException(status_code=400, detail=f"Unknown domain: {flagged_domain}")
+
+    selected_fields = RECORD_FIELDS
+    if fields:
+        selected_fields = tuple(field.strip() for field in fields.split(",") if field.strip())
+        unknown = [field for field in selected_fields if field not in RECORD_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    after_id = None
+    if cursor is not None:
+        after_id = parse_assessment_id(cursor)
+        if after_id is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    filters = {
+        "instrument": instrument,
+        "risk": risk,
+        "flagged_domain": flagged_domain,
+        "created_from": stored_timestamp(created_from),
+        "created_to": stored_timestamp(created_to),
+        "min_age": min_age,
+        "max_age": max_age,
+    }
+
+    if format == "ndjson":
+        async def stream_records():
+            async for record in assessment_store.iter_records({**filters, "after_id": after_id}, selected_fields):
+                yield json.dumps(record) + "\n"
+
+        return StreamingResponse(stream_records(), media_type="application/x-ndjson")
+
+    records, next_cursor = await assessment_store.page({**filters, "after_id": after_id}, selected_fields, limit)
     return {
-        "total_assessments": len(assessments_db),
-        "assessments": assessments_db
+        "total_assessments": await assessment_store.count(filters) if include_total else None,
+        "assessments": records,
+        "next_cursor": format_assessment_id(next_cursor) if next_cursor is not None else None,
     }
 
+async def cohort_summary(version):
+    instrument = get_instrument_or_404(version) if version else default_instrument()
+    return analytics.summarize(await assessment_store.read_counters(), instrument)
+
+@app.get("/api/analytics/cohort")
+async def get_cohort_analytics(instrument: Optional[str] = None):
+    """Population dashboard aggregates for one questionnaire version, read from the running counters."""
+    return await cohort_summary(instrument)
+
+@app.get("/api/analytics/risk-by-age")
+async def get_risk_by_age(instrument: Optional[str] = None):
+    summary = await cohort_summary(instrument)
+    return {
+        "instrument": summary["instrument"],
+        "total_assessments": summary["total_assessments"],
+        "risk_by_age_band": summary["risk_by_age_band"],
+        "risk_distribution": summary["risk_distribution"],
+    }
+
+@app.get("/api/analytics/domain-scores")
+async def get_domain_score_histograms(instrument: Optional[str] = None):
+    summary = await cohort_summary(instrument)
+    return {
+        "instrument": summary["instrument"],
+        "total_assessments": summary["total_assessments"],
+        "domain_score_histograms": summary["domain_score_histograms"],
+    }
+
+@app.get("/api/analytics/answers")
+async def get_answer_frequencies(instrument: Optional[str] = None):
+    summary = await cohort_summary(instrument)
+    return {
+        "instrument": summary["instrument"],
+        "total_assessments": summary["total_assessments"],
+        "answer_frequencies": summary["answer_frequencies"],
+    }
+
+@app.get("/api/jobs")
+async def get_job_queue():
+    """Queue depth by status and job kind, plus this worker's processing counts."""
+    processed = {}
+    for (kind, outcome), count in job_queue.stats.items():
+        processed.setdefault(kind, {})[outcome] = count
+    return {**await job_queue.backend.depth(), "processed": processed}
+
+@app.get("/api/jobs/dead-letters")
+async def get_dead_letters(limit: int = Query(100, ge=1, le=1000)):
+    return {"jobs": await job_queue.backend.dead_letters(limit)}
+
+@app.post("/api/jobs/dead-letters/requeue")
+async def requeue_dead_letters():
+    """Return every dead-lettered job to the queue with a fresh set of attempts."""
+    return {"requeued": await job_queue.backend.requeue_dead()}
+
+@app.post("/api/calibration/simulate")
+async def simulate_thresholds(request: CalibrationRequest):
+    """What-if flag rates and risk distribution for candidate thresholds over stored assessments.
+
+    Returns the current thresholds' outcome and the `limit` configurations with
+    the lowest `sort` value (fewest reclassified assessments by default).
+    """
+    instrument = get_instrument_or_404(request.instrument) if request.instrument else default_instrument()
+    try:
+        if request.thresholds is not None:
+            if len(request.thresholds) > MAX_CALIBRATION_CONFIGS:
+                raise ValueError(f"At most {MAX_CALIBRATION_CONFIGS} configurations per request")
+            thresholds = calibration.threshold_rows(request.thresholds, instrument)
+        else:
+            # The grid size is checked before the grid is built
+            thresholds = calibration.threshold_grid(
+                request.grid or calibration.default_ranges(instrument), instrument, MAX_CALIBRATION_CONFIGS
+            )
+        cohort = await calibration.cohort_from_store(assessment_store, {
+            "created_from": stored_timestamp(request.created_from),
+            "created_to": stored_timestamp(request.created_to),
+            "min_age": request.min_age,
+            "max_age": request.max_age,
+        }, instrument)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    started = time.perf_counter()
+    # NumPy work runs off the event loop
+    simulation = await asyncio.to_thread(calibration.simulate, cohort, thresholds, instrument)
+    elapsed = time.perf_counter() - started
+    return {
+        "instrument": instrument.version,
+        "cohort_size": cohort.size,
+        "configurations": len(simulation.thresholds),
+        "elapsed_seconds": round(elapsed, 6),
+        "current": calibration.baseline_row(cohort, instrument),
+        "results": calibration.top_rows(simulation, request.sort, request.limit, instrument),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request and scoring metrics in the Prometheus text exposition format.
+
+    Values are per process; with several workers, scrape each one.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
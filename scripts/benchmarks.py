@@ -0,0 +1,282 @@
+"""Reproducible benchmarks for the scoring engine and the API.
+
+Usage (from the scripts directory, with requirements-dev.txt installed):
+
+    python benchmarks.py                          # run everything, print a summary
+    python benchmarks.py --output results.json    # also save results as JSON
+    python benchmarks.py --compare base.json      # show change against a saved run
+
+Micro-benchmarks time calculate_domain_scores / generate_assessment across
+answer densities, and request parsing / response serialization for
+/api/submit-assessment (the generic pydantic path against the fast path). The load test drives /api/submit-assessment and
+/api/assessments in-process through the ASGI transport, with a throwaway
+SQLite databases and log file, and reports latency percentiles, requests per
+second and peak RSS.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+
+from assessment_logic import DevelopmentalScreeningBot, ResultCache
+
+
+DENSITIES = (0.25, 0.5, 0.75, 1.0)
+
+
+def make_responses(bot, density, rng):
+    """Random 1-4 answers for roughly `density` of the questions; the rest are blank."""
+    return {key: str(rng.randint(1, 4)) if rng.random() < density else "" for key in bot.question_keys}
+
+
+def make_submission(bot, density, rng):
+    return {
+        "name": "Benchmark Parent",
+        "email": "benchmark@example.com",
+        "age": rng.randint(2, 12),
+        "marital_status": "Parent",
+        **make_responses(bot, density, rng),
+    }
+
+
+def time_per_call(fn, samples, repeat=5):
+    """Best-of-`repeat` time per call in microseconds over `samples` inputs."""
+    index = iter(range(1 << 62))
+    timer = timeit.Timer(lambda: fn(samples[next(index) % len(samples)]))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def run_micro(seed=0, sample_size=1000):
+    bot = DevelopmentalScreeningBot(cache=None)
+    # Large enough to hold every sample, so timed calls after the first pass are cache hits
+    cached_bot = DevelopmentalScreeningBot(cache=ResultCache(maxsize=sample_size * len(DENSITIES)))
+    rng = random.Random(seed)
+    results = {}
+
+    for density in DENSITIES:
+        samples = [make_responses(bot, density, rng) for _ in range(sample_size)]
+        scores = [bot.calculate_domain_scores(sample) for sample in samples]
+
+        batch_start = time.perf_counter()
+        bot.calculate_domain_scores_batch(samples)
+        batch_elapsed = time.perf_counter() - batch_start
+
+        # Pre-encoded answer matrix: the cost of the vectorized scoring itself
+        values, _ = bot.encode_responses(samples)
+        array_start = time.perf_counter()
+        bot.calculate_domain_scores_batch(values)
+        array_elapsed = time.perf_counter() - array_start
+
+        results[f"density_{density:.2f}"] = {
+            "calculate_domain_scores_us": round(time_per_call(bot.calculate_domain_scores, samples), 3),
+            "generate_assessment_us": round(time_per_call(lambda s: bot.generate_assessment(s, 5), scores), 3),
+            "assess_cached_us": round(time_per_call(lambda s: cached_bot.assess(s, 5), samples), 3),
+            "calculate_domain_scores_batch_us_per_row": round(batch_elapsed / sample_size * 1e6, 3),
+            "calculate_domain_scores_batch_array_us_per_row": round(array_elapsed / sample_size * 1e6, 3),
+        }
+
+    return results
+
+
+def run_request_path(seed=0, sample_size=1000):
+    """Per-request parse and serialize cost: dict + model + AssessmentResponse against the fast path."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    import backend
+
+    bot = backend.get_bot(backend.default_instrument())
+    model = backend.build_request_model(bot.instrument)
+    rng = random.Random(seed)
+    bodies = [json.dumps(make_submission(bot, rng.choice(DENSITIES), rng)).encode() for _ in range(sample_size)]
+    _, result = bot.assess(model.model_validate_json(bodies[0]).__dict__, 5)
+
+    def parse_generic(body):
+        assessment = model.model_validate(json.loads(body))
+        return bot.instrument.extract_responses(assessment), assessment.model_dump()
+
+    def serialize_generic(result):
+        response = backend.AssessmentResponse(success=True, assessment_id="assessment_1", **{
+            key: result[key] for key in
+            ("message", "overall_risk", "domain_scores", "flagged_domains", "detailed_message", "recommendations")
+        })
+        return JSONResponse(jsonable_encoder(response))
+
+    return {
+        "orjson": backend.orjson is not None,
+        "parse_generic_us": round(time_per_call(parse_generic, bodies), 3),
+        "parse_fast_us": round(time_per_call(model.model_validate_json, bodies), 3),
+        "serialize_generic_us": round(time_per_call(serialize_generic, [result]), 3),
+        "serialize_fast_us": round(time_per_call(
+            lambda r: backend.FastJSONResponse(backend.assessment_response(r, "assessment_1")), [result]), 3),
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize_latencies(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+async def drive(client, make_request, total, concurrency):
+    """Issue `total` requests from `concurrency` concurrent workers and collect per-request latency."""
+    latencies = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"Unexpected status {response.status_code}: {response.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize_latencies(latencies, time.perf_counter() - started)
+
+
+async def run_load(requests, concurrency, seed=0):
+    import httpx
+    import backend
+
+    bot = backend.get_bot(backend.default_instrument())
+    rng = random.Random(seed)
+    submissions = [make_submission(bot, rng.choice(DENSITIES), rng) for _ in range(min(requests, 1000))]
+
+    async def submit(client, i):
+        return await client.post("/api/submit-assessment", json=submissions[i % len(submissions)])
+
+    async def list_page(client, i):
+        return await client.get("/api/assessments", params={"limit": 100})
+
+    await backend.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            return {
+                "submit_assessment": await drive(client, submit, requests, concurrency),
+                "list_assessments": await drive(client, list_page, max(1, requests // 10), concurrency),
+            }
+    finally:
+        await backend.app.router.shutdown()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline):
+    """Print metrics that exist in both runs with their relative change."""
+    base = flatten({key: baseline.get(key, {}) for key in ("micro", "load")})
+    now = flatten({key: current.get(key, {}) for key in ("micro", "load")})
+    print(f"\nComparison against {baseline.get('meta', {}).get('commit') or 'baseline'}:")
+    for name in sorted(base.keys() & now.keys()):
+        before, after = base[name], now[name]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {name:<70} {before:>12} -> {after:>12}  {change}")
+
+
+def run_all(args):
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+    }
+    if not args.skip_micro:
+        results["micro"] = run_micro(args.seed)
+        results["micro"]["request_path"] = run_request_path(args.seed)
+    if not args.skip_load:
+        results["load"] = asyncio.run(run_load(args.requests, args.concurrency, args.seed))
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring engine and API")
+    parser.add_argument("--requests", type=int, default=2000, help="load-test requests per endpoint run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results from a previous run to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="assessment-bench-")
+    os.environ["ASSESSMENT_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["ASSESSMENT_JOBS_DB_PATH"] = os.path.join(workdir, "jobs.db")
+    os.environ["ASSESSMENT_LOG_SINKS"] = f"file:{os.path.join(workdir, 'bench.log')}"
+    # Every load-test request enqueues a report email and a CRM lead; without these
+    # settings the handlers only log, so a loaded .env never reaches real services
+    for name in list(os.environ):
+        if name.startswith(("SMTP_", "ODOO_")):
+            del os.environ[name]
+
+    try:
+        results = run_all(args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
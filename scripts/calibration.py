@@ -0,0 +1,353 @@
+"""What-if simulation of flag thresholds against a stored cohort.
+
+A cohort is reduced to its distinct domain-score rows and how many
+assessments share each one, so nothing is ever evaluated per record. Each
+threshold configuration is summarized as the number of assessments per
+flagged-domain mask; flag rates and the Low/Moderate/High split then follow
+from the instrument's 16 result templates, so the risk rules are the ones
+generate_assessment applies.
+
+When the score space is small (it is 25^4 cells for the v1 instrument) the
+rows are binned into a dense histogram and turned into one prefix-sum table
+per mask, after which any configuration costs 16 lookups whatever the cohort
+size. Larger score spaces fall back to comparing configurations with the
+distinct rows in broadcast chunks.
+
+    python calibration.py simulate --db assessments.db --range Behavioral=10:18 --output grid.csv
+    python calibration.py simulate --columnar assessments.col --top 10 --sort High
+
+Without --range or --thresholds-file every domain sweeps its current
+threshold +/-4 (9^4 = 6561 configurations).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from assessment_logic import INSTRUMENT, load_instrument
+from storage import RISK_LEVELS, SCORE_COLUMNS, SQLiteAssessmentStore
+
+
+# Upper bound on broadcast elements (configurations x distinct rows) evaluated at once
+CHUNK_ELEMENTS = 1 << 22
+
+# Largest score space (product of per-domain score ranges) simulated with prefix-sum tables
+DENSE_CELL_LIMIT = 1 << 19
+
+DEFAULT_SPREAD = 4
+
+
+class Cohort(NamedTuple):
+    scores: np.ndarray   # (distinct rows, domains) in instrument.domains order
+    counts: np.ndarray   # assessments sharing each row
+
+    @property
+    def size(self):
+        return int(self.counts.sum())
+
+
+def cohort_from_scores(scores):
+    """Compress an (N, domains) score matrix, e.g. ColumnarAssessments.scores(), into a Cohort."""
+    scores = np.asarray(scores, dtype=np.int64)
+    if not len(scores):
+        return Cohort(scores.reshape(0, scores.shape[-1]), np.zeros(0, dtype=np.int64))
+    # Unique over one mixed-radix key per row is much faster than np.unique(axis=0)
+    low = scores.min(axis=0)
+    dims = scores.max(axis=0) - low + 1
+    keys, counts = np.unique(np.ravel_multi_index((scores - low).T, dims), return_counts=True)
+    return Cohort(np.stack(np.unravel_index(keys, dims), axis=1) + low, counts.astype(np.int64))
+
+
+async def cohort_from_store(store, filters=None, instrument=INSTRUMENT):
+    """Build a Cohort from the assessments an AssessmentStore holds for `instrument`'s version.
+
+    When every domain has a score column the grouping happens in the database;
+    otherwise the per-record scores are streamed and grouped here.
+    """
+    filters = {**(filters or {}), "instrument": instrument.version}
+    if any(domain not in SCORE_COLUMNS for domain in instrument.domains):
+        rows = [
+            [record["domain_scores"].get(domain, 0) for domain in instrument.domains]
+            async for record in store.iter_records(filters, ("domain_scores",), chunk_size=5000)
+        ]
+        return cohort_from_scores(np.array(rows, dtype=np.int64).reshape(-1, len(instrument.domains)))
+    order = [list(SCORE_COLUMNS).index(domain) for domain in instrument.domains]
+    histogram = await store.score_histogram(filters)
+    scores = np.array([row for row, _ in histogram], dtype=np.int64).reshape(-1, len(SCORE_COLUMNS))
+    counts = np.array([count for _, count in histogram], dtype=np.int64)
+    return Cohort(scores[:, order], counts)
+
+
+def _int_array(values):
+    try:
+        return np.asarray(values, dtype=np.int64)
+    except OverflowError:
+        raise ValueError("Thresholds must fit in a 64-bit integer")
+
+
+def threshold_grid(ranges, instrument=INSTRUMENT, max_configurations=None):
+    """Cartesian product of per-domain candidate thresholds.
+
+    `ranges` maps a domain to an iterable of thresholds; domains left out keep
+    their current threshold. Returns a (configurations, domains) int array.
+    Grids larger than `max_configurations` are rejected before anything is
+    allocated for them.
+    """
+    unknown = set(ranges) - set(instrument.domains)
+    if unknown:
+        raise ValueError(f"Unknown domain: {', '.join(sorted(unknown))}")
+    axes = [
+        np.unique(_int_array(list(ranges[domain]))) if domain in ranges else np.array([current])
+        for domain, current in zip(instrument.domains, instrument.threshold_list)
+    ]
+    if any(len(axis) == 0 for axis in axes):
+        raise ValueError("Every domain needs at least one candidate threshold")
+    if max_configurations is not None and math.prod(len(axis) for axis in axes) > max_configurations:
+        raise ValueError(f"At most {max_configurations} configurations per request")
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(axes))
+
+
+def threshold_rows(thresholds, instrument=INSTRUMENT):
+    """Validate explicit configurations as a (configurations, domains) int array."""
+    if isinstance(thresholds, list) and any(len(row) != len(instrument.domains) for row in thresholds):
+        raise ValueError(f"Each configuration needs {len(instrument.domains)} thresholds")
+    thresholds = np.atleast_2d(_int_array(thresholds))
+    if not thresholds.size:
+        raise ValueError("At least one threshold configuration is required")
+    if thresholds.ndim != 2 or thresholds.shape[1] != len(instrument.domains):
+        raise ValueError(f"Each configuration needs {len(instrument.domains)} thresholds")
+    return thresholds
+
+
+def default_ranges(instrument=INSTRUMENT, spread=DEFAULT_SPREAD):
+    return {
+        domain: range(max(0, current - spread), current + spread + 1)
+        for domain, current in zip(instrument.domains, instrument.threshold_list)
+    }
+
+
+class Simulation(NamedTuple):
+    thresholds: np.ndarray     # (K, domains)
+    flag_rates: np.ndarray     # (K, domains) share of the cohort flagged in each domain
+    risk_counts: np.ndarray    # (K, risk levels) assessments per RISK_LEVELS entry
+    reclassified: np.ndarray   # (K,) assessments whose overall risk differs from the current thresholds
+    cohort_size: int
+
+
+def _orthant_sums(histogram):
+    """Prefix-sum tables answering "how many rows get exactly this flag mask" for any thresholds.
+
+    `histogram` counts rows per cell of the shifted score space. Returns one
+    array per flag mask m, indexed by per-domain threshold positions t (0..n),
+    holding the number of rows with score >= t in the domains of m and < t in
+    the others.
+    """
+    tables = {0: histogram}
+    for axis in range(histogram.ndim):
+        split = {}
+        for mask, table in tables.items():
+            below = np.cumsum(table, axis=axis)
+            below = np.concatenate([np.zeros_like(np.take(below, [0], axis=axis)), below], axis=axis)
+            split[mask] = below
+            split[mask | (1 << axis)] = np.take(below, [-1], axis=axis) - below
+        tables = split
+    return tables
+
+
+def _dense_counts(cohort, thresholds, current_risk, mask_risk, low, dims):
+    """Mask histograms and reclassification counts with cost independent of the cohort size."""
+    positions = tuple(np.clip(thresholds - low, 0, dims).T)
+    masks = len(mask_risk)
+    histograms = np.zeros((len(thresholds), masks), dtype=np.int64)
+    reclassified = np.zeros(len(thresholds), dtype=np.int64)
+    cells = np.ravel_multi_index((cohort.scores - low).T, dims)
+    # One pass per current risk level, so changed classifications can be counted too
+    for risk in np.unique(current_risk):
+        rows = current_risk == risk
+        histogram = np.bincount(cells[rows], weights=cohort.counts[rows], minlength=int(np.prod(dims)))
+        tables = _orthant_sums(histogram.astype(np.int64).reshape(dims))
+        counts = np.stack([tables[mask][positions] for mask in range(masks)], axis=1)
+        histograms += counts
+        reclassified += counts @ (mask_risk != risk)
+    return histograms, reclassified
+
+
+def _broadcast_counts(cohort, thresholds, current_risk, mask_risk, mask_bits, chunk_elements):
+    """Mask histograms and reclassification counts by comparing every configuration with every row."""
+    masks = len(mask_risk)
+    histograms = np.empty((len(thresholds), masks), dtype=np.int64)
+    reclassified = np.empty(len(thresholds), dtype=np.int64)
+    chunk = max(1, chunk_elements // max(1, len(cohort.counts)))
+    for start in range(0, len(thresholds), chunk):
+        block = thresholds[start:start + chunk]
+        # (configurations, rows) flag masks from one broadcast comparison
+        mask = (cohort.scores[None, :, :] >= block[:, None, :]) @ mask_bits
+        offsets = (np.arange(len(block)) * masks)[:, None]
+        histograms[start:start + len(block)] = np.bincount(
+            (mask + offsets).ravel(),
+            weights=np.broadcast_to(cohort.counts, mask.shape).ravel(),
+            minlength=len(block) * masks,
+        ).reshape(len(block), masks)
+        reclassified[start:start + len(block)] = (mask_risk[mask] != current_risk) @ cohort.counts
+    return histograms, reclassified
+
+
+def simulate(cohort, thresholds, instrument=INSTRUMENT, chunk_elements=CHUNK_ELEMENTS):
+    """Evaluate every threshold configuration (rows of `thresholds`) against the cohort."""
+    thresholds = threshold_rows(thresholds, instrument)
+
+    # Per-mask lookup tables: the domains a flag mask covers and the risk level its template reports
+    masks = len(instrument.templates)
+    mask_domains = ((np.arange(masks)[:, None] & instrument.mask_bits) != 0).astype(np.int64)
+    risk_index = {level: i for i, level in enumerate(RISK_LEVELS)}
+    mask_risk = np.array([risk_index[template.overall_risk] for template in instrument.templates])
+    mask_risk_onehot = (mask_risk[:, None] == np.arange(len(RISK_LEVELS))).astype(np.int64)
+
+    size = cohort.size
+    if not size:
+        histograms = np.zeros((len(thresholds), masks), dtype=np.int64)
+        reclassified = np.zeros(len(thresholds), dtype=np.int64)
+    else:
+        current_risk = mask_risk[instrument.flag_masks(cohort.scores)]
+        low = cohort.scores.min(axis=0)
+        dims = cohort.scores.max(axis=0) - low + 1
+        # Building the tables costs a fixed amount, only worth it beyond a single broadcast chunk
+        broadcast_elements = len(thresholds) * len(cohort.counts)
+        if broadcast_elements > chunk_elements and np.prod(dims + 1) <= DENSE_CELL_LIMIT:
+            histograms, reclassified = _dense_counts(cohort, thresholds, current_risk, mask_risk, low, dims)
+        else:
+            histograms, reclassified = _broadcast_counts(
+                cohort, thresholds, current_risk, mask_risk, instrument.mask_bits, chunk_elements)
+
+    flag_rates = histograms @ mask_domains / size if size else np.zeros(thresholds.shape)
+    return Simulation(thresholds, flag_rates, histograms @ mask_risk_onehot, reclassified, size)
+
+
+SORT_KEYS = (*RISK_LEVELS, "reclassified")
+
+
+def simulation_rows(simulation, instrument=INSTRUMENT, indices=None):
+    """One JSON-friendly dict per configuration (or per configuration in `indices`)."""
+    size = simulation.cohort_size
+    rows = []
+    for k in range(len(simulation.thresholds)) if indices is None else indices:
+        thresholds = simulation.thresholds[k].tolist()
+        counts = simulation.risk_counts[k].tolist()
+        rows.append({
+            "thresholds": dict(zip(instrument.domains, thresholds)),
+            "flag_rates": {
+                domain: round(rate, 6) for domain, rate in zip(instrument.domains, simulation.flag_rates[k].tolist())
+            },
+            "risk_counts": dict(zip(RISK_LEVELS, counts)),
+            "risk_distribution": {level: round(count / size, 6) if size else 0.0 for level, count in zip(RISK_LEVELS, counts)},
+            "reclassified": int(simulation.reclassified[k]),
+        })
+    return rows
+
+
+def top_rows(simulation, sort="reclassified", limit=10, instrument=INSTRUMENT):
+    """Rows for the `limit` configurations with the lowest `sort` value (a risk level or "reclassified")."""
+    if sort == "reclassified":
+        key = simulation.reclassified
+    else:
+        key = simulation.risk_counts[:, RISK_LEVELS.index(sort)]
+    return simulation_rows(simulation, instrument, np.argsort(key, kind="stable")[:limit].tolist())
+
+
+def baseline_row(cohort, instrument=INSTRUMENT):
+    return simulation_rows(simulate(cohort, [instrument.threshold_list], instrument), instrument)[0]
+
+
+def write_csv(rows, instrument, f):
+    writer = csv.writer(f)
+    writer.writerow([
+        *(f"threshold:{domain}" for domain in instrument.domains),
+        *(f"flag_rate:{domain}" for domain in instrument.domains),
+        *RISK_LEVELS,
+        "reclassified",
+    ])
+    for row in rows:
+        writer.writerow([
+            *row["thresholds"].values(), *row["flag_rates"].values(), *row["risk_counts"].values(), row["reclassified"],
+        ])
+
+
+def parse_range(spec):
+    """Parse `Domain=low:high[:step]` (inclusive) or `Domain=a,b,c`."""
+    domain, separator, values = spec.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"Expected Domain=low:high or Domain=a,b,c, got {spec!r}")
+    try:
+        if ":" in values:
+            low, high, *step = (int(part) for part in values.split(":"))
+            return domain, range(low, high + 1, *step)
+        return domain, [int(part) for part in values.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid thresholds in {spec!r}")
+
+
+async def load_store_cohort(db_path, instrument):
+    store = SQLiteAssessmentStore(db_path)
+    await store.open()
+    try:
+        return await cohort_from_store(store, instrument=instrument)
+    finally:
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate flag thresholds against stored assessments")
+    commands = parser.add_subparsers(dest="command", required=True)
+    simulate_parser = commands.add_parser("simulate", help="sweep threshold configurations over a cohort")
+    source = simulate_parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default="assessments.db")
+    source.add_argument("--columnar", help="exported column file (see columnar.py)")
+    simulate_parser.add_argument("--instrument", default=INSTRUMENT.version)
+    simulate_parser.add_argument("--range", dest="ranges", action="append", type=parse_range, default=[],
+                                 help="candidate thresholds for one domain, e.g. Behavioral=10:18")
+    simulate_parser.add_argument("--thresholds-file", help="JSON list of configurations, each a list in domain order")
+    simulate_parser.add_argument("--output", help="write every configuration as CSV to this path")
+    simulate_parser.add_argument("--sort", choices=SORT_KEYS, default="reclassified")
+    simulate_parser.add_argument("--top", type=int, default=10, help="configurations to print, lowest --sort first")
+    args = parser.parse_args()
+
+    if args.columnar:
+        from columnar import ColumnarAssessments
+
+        table = ColumnarAssessments.load(args.columnar)
+        instrument = table.instrument
+        cohort = cohort_from_scores(table.scores())
+    else:
+        instrument = load_instrument(args.instrument)
+        cohort = asyncio.run(load_store_cohort(args.db, instrument))
+
+    try:
+        if args.thresholds_file:
+            with open(args.thresholds_file) as f:
+                thresholds = threshold_rows(json.load(f), instrument)
+        else:
+            thresholds = threshold_grid(dict(args.ranges) or default_ranges(instrument), instrument)
+        started = time.perf_counter()
+        simulation = simulate(cohort, thresholds, instrument)
+        elapsed = time.perf_counter() - started
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"{len(thresholds)} configurations x {cohort.size} assessments ({len(cohort.counts)} distinct score rows) "
+          f"in {elapsed:.3f}s")
+    print("Current thresholds:", json.dumps(baseline_row(cohort, instrument)))
+    for row in top_rows(simulation, args.sort, args.top, instrument):
+        print(json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            write_csv(simulation_rows(simulation, instrument), instrument, f)
+
+
+if __name__ == "__main__":
+    main()
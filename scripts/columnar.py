@@ -0,0 +1,258 @@
+"""Compact columnar representation of scored assessments.
+
+Each question is one int8 column (1-4, 0 = unanswered or out of range), each
+domain score one int16 column, the overall risk an enum-coded uint8 and the
+result text a uint8 template id (the flagged-domain bitmask) into the
+instrument's shared templates. A row costs about 50 bytes instead of the
+kilobytes a full record dict takes.
+
+Tables export to a single binary file: a magic string, a JSON header and
+64-byte aligned column blocks. load() memory-maps that file, so every column
+is a zero-copy view and analytics can scan millions of screenings without
+reading them into memory first.
+
+    python columnar.py export --db assessments.db --output assessments.col
+    python columnar.py info assessments.col
+"""
+import argparse
+import asyncio
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from assessment_logic import INSTRUMENT, DevelopmentalScreeningBot, load_instrument
+from storage import RISK_LEVELS, SQLiteAssessmentStore, parse_assessment_id
+
+
+MAGIC = b"ASMCOL01"
+ALIGNMENT = 64
+
+RISK_CODES = {level: code for code, level in enumerate(RISK_LEVELS)}
+
+EPOCH = datetime(1970, 1, 1)
+
+# Answer values that fit the int8 answer columns; anything else is stored as 0
+ANSWER_RANGE = (1, 4)
+
+
+def _timestamp_us(timestamp):
+    """Microseconds since the epoch; naive timestamps are taken as-is, aware ones converted to UTC."""
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+class ColumnarAssessments:
+    """Growable column store for scored assessments of one instrument."""
+
+    def __init__(self, instrument=INSTRUMENT, capacity=1024):
+        self.instrument = instrument
+        # Parses answers with the same rules as the batch scorer
+        self._encoder = DevelopmentalScreeningBot(instrument, cache=None)
+        self._length = 0
+        self._columns = self._allocate(capacity)
+
+    def _column_specs(self):
+        specs = [("id", np.int64), ("created_us", np.int64), ("age", np.int16)]
+        specs += [(f"answer:{key}", np.int8) for key in self.instrument.question_keys]
+        specs += [(f"score:{domain}", np.int16) for domain in self.instrument.domains]
+        specs += [("risk", np.uint8), ("template", np.uint8)]
+        return specs
+
+    def _allocate(self, capacity):
+        return {name: np.zeros(capacity, dtype=dtype) for name, dtype in self._column_specs()}
+
+    def _reserve(self, extra):
+        capacity = len(self._columns["id"])
+        needed = self._length + extra
+        if needed <= capacity:
+            return
+        if not all(column.flags.writeable for column in self._columns.values()):
+            raise ValueError("Memory-mapped tables are read-only")
+        new_capacity = max(needed, capacity * 2)
+        for name, column in self._columns.items():
+            grown = np.zeros(new_capacity, dtype=column.dtype)
+            grown[:self._length] = column[:self._length]
+            self._columns[name] = grown
+
+    def __len__(self):
+        return self._length
+
+    def column(self, name):
+        """Return a view of one column, e.g. "age", "risk", "answer:clumsy" or "score:Motor Skills"."""
+        return self._columns[name][:self._length]
+
+    def answers(self):
+        """(N, questions) int8 matrix in instrument.question_keys order."""
+        return np.stack([self.column(f"answer:{key}") for key in self.instrument.question_keys], axis=1)
+
+    def scores(self):
+        """(N, domains) int16 matrix in instrument.domains order."""
+        return np.stack([self.column(f"score:{domain}") for domain in self.instrument.domains], axis=1)
+
+    def extend(self, records):
+        """Append API-shaped records (id, timestamp, instrument, data, domain_scores, result)."""
+        records = list(records)
+        if not records:
+            return
+        if any(record.get("instrument", self.instrument.version) != self.instrument.version for record in records):
+            raise ValueError(f"Records scored with another questionnaire version than {self.instrument.version}")
+        self._reserve(len(records))
+        start, end = self._length, self._length + len(records)
+        domain_index = {domain: d for d, domain in enumerate(self.instrument.domains)}
+
+        values, answered = self._encoder.encode_responses([record["data"] for record in records])
+        low, high = ANSWER_RANGE
+        in_range = answered & (values >= low) & (values <= high)
+        answers = np.where(in_range, values, 0).astype(np.int8)
+        for q, key in enumerate(self.instrument.question_keys):
+            self._columns[f"answer:{key}"][start:end] = answers[:, q]
+
+        for domain in self.instrument.domains:
+            self._columns[f"score:{domain}"][start:end] = [record["domain_scores"].get(domain, 0) for record in records]
+
+        self._columns["id"][start:end] = [parse_assessment_id(record["id"]) for record in records]
+        self._columns["created_us"][start:end] = [_timestamp_us(record["timestamp"]) for record in records]
+        self._columns["age"][start:end] = [record["data"]["age"] for record in records]
+        self._columns["risk"][start:end] = [RISK_CODES[record["result"]["overall_risk"]] for record in records]
+        self._columns["template"][start:end] = [
+            sum(1 << domain_index[domain] for domain in record["result"]["flagged_domains"])
+            for record in records
+        ]
+        self._length = end
+
+    def result(self, row):
+        """Rebuild the result dict for one row from its interned template."""
+        template = self.instrument.templates[int(self._columns["template"][row])]
+        domain_scores = {domain: int(self._columns[f"score:{domain}"][row]) for domain in self.instrument.domains}
+        return {
+            "overall_risk": template.overall_risk,
+            "domain_scores": domain_scores,
+            "flagged_domains": list(template.flagged_domains),
+            "message": template.message,
+            "detailed_message": template.detailed_message,
+            "recommendations": list(template.recommendations),
+        }
+
+    def nbytes(self):
+        return sum(self.column(name).nbytes for name in self._columns)
+
+    def export(self, path):
+        """Write the table to `path` in the aligned, memory-mappable column format."""
+        columns = []
+        offset = 0
+        for name, column in self._columns.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            nbytes = self._length * column.dtype.itemsize
+            columns.append({"name": name, "dtype": column.dtype.str, "offset": offset, "nbytes": nbytes})
+            offset += nbytes
+
+        header = json.dumps({
+            "rows": self._length,
+            "instrument_version": self.instrument.version,
+            "instrument_fingerprint": self.instrument.fingerprint,
+            "columns": columns,
+        }).encode("utf-8")
+        # Column offsets are relative to the aligned start of the data section
+        data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for spec in columns:
+                f.seek(data_start + spec["offset"])
+                f.write(self.column(spec["name"]).tobytes())
+            f.truncate(data_start + offset)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open an exported table. With mmap=True the columns are read-only views of the file."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an assessment column file")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length))
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+
+        instrument = load_instrument(header["instrument_version"])
+        if instrument.fingerprint != header["instrument_fingerprint"]:
+            raise ValueError(
+                f"{path} was written with a different definition of instrument {header['instrument_version']}"
+            )
+
+        table = cls.__new__(cls)
+        table.instrument = instrument
+        table._encoder = DevelopmentalScreeningBot(instrument, cache=None)
+        table._length = header["rows"]
+        if mmap and table._length:
+            buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            with open(path, "rb") as f:
+                buffer = np.frombuffer(f.read(), dtype=np.uint8)
+
+        table._columns = {}
+        for spec in header["columns"]:
+            start = data_start + spec["offset"]
+            if table._length:
+                column = buffer[start:start + spec["nbytes"]].view(np.dtype(spec["dtype"]))
+            else:
+                column = np.zeros(0, dtype=np.dtype(spec["dtype"]))
+            if not mmap:
+                column = column.copy()
+            table._columns[spec["name"]] = column
+        return table
+
+    @classmethod
+    async def from_store(cls, store, instrument=INSTRUMENT, filters=None, chunk_size=5000):
+        """Build a table by streaming `instrument`'s records out of an AssessmentStore in chunks."""
+        table = cls(instrument)
+        chunk = []
+        filters = {**(filters or {}), "instrument": instrument.version}
+        async for record in store.iter_records(filters, chunk_size=chunk_size):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                table.extend(chunk)
+                chunk = []
+        table.extend(chunk)
+        return table
+
+
+async def export_store(db_path, output, instrument=INSTRUMENT):
+    store = SQLiteAssessmentStore(db_path)
+    await store.open()
+    try:
+        table = await ColumnarAssessments.from_store(store, instrument)
+    finally:
+        await store.close()
+    table.export(output)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and inspect columnar assessment files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="export a SQLite assessment database")
+    export_parser.add_argument("--db", default="assessments.db")
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--instrument", default=INSTRUMENT.version, help="questionnaire version to export")
+    info_parser = commands.add_parser("info", help="summarize an exported file")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        table = asyncio.run(export_store(args.db, args.output, load_instrument(args.instrument)))
+        print(f"Exported {len(table)} assessments ({table.nbytes()} bytes of column data) to {args.output}")
+    else:
+        table = ColumnarAssessments.load(args.path)
+        risk_counts = np.bincount(table.column("risk"), minlength=len(RISK_LEVELS))
+        print(f"{len(table)} assessments, instrument {table.instrument.version}")
+        for level, count in zip(RISK_LEVELS, risk_counts.tolist()):
+            print(f"  {level}: {count}")
+
+
+if __name__ == "__main__":
+    main()
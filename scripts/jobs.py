@@ -0,0 +1,471 @@
+"""Persistent in-process job queue for work that runs after a request returns.
+
+Jobs are (kind, JSON payload) rows in a JobBackend. A JobQueue running on the
+server's event loop claims ready jobs in batches, hands each batch to the
+handler registered for its kind and records the outcome:
+
+- at most `concurrency` batches run at once;
+- a failed job is retried with exponential backoff until max_attempts, then
+  moved to the dead-letter list;
+- claims are leases, so several server workers can share one backend, and a
+  job claimed by a worker that died is picked up again once its lease expires.
+  Leases are renewed while a batch runs, so a slow batch is never claimed twice.
+
+Handlers take a list of Job objects and return {job_id: error message} for the
+jobs that failed (an empty dict when all succeeded). Raising an exception
+fails the whole batch.
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from audit_log import EMAIL_PATTERN, REDACTED, logger
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DEAD = "dead"
+STATUSES = (QUEUED, RUNNING, DEAD)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind         TEXT    NOT NULL,
+    payload      TEXT    NOT NULL,
+    status       TEXT    NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'dead')),
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    run_at       REAL    NOT NULL,
+    locked_until REAL,
+    last_error   TEXT,
+    created_at   REAL    NOT NULL,
+    updated_at   REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_ready_idx ON job (status, kind, run_at);
+"""
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+
+
+class Handler(NamedTuple):
+    fn: object
+    batch_size: int
+
+
+class JobBackend:
+    """Interface for queue storage. Completed jobs are deleted; dead ones are kept."""
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def enqueue_many(self, jobs):
+        """Add (kind, payload) pairs and return their ids."""
+        raise NotImplementedError
+
+    async def enqueue(self, kind, payload):
+        return (await self.enqueue_many([(kind, payload)]))[0]
+
+    async def claim(self, kind, limit, lease_seconds):
+        """Lease up to `limit` ready jobs of `kind`, counting the attempt; returns Job objects."""
+        raise NotImplementedError
+
+    async def renew(self, job_ids, lease_seconds):
+        """Extend the leases of running jobs by `lease_seconds` from now."""
+        raise NotImplementedError
+
+    async def complete(self, job_ids):
+        raise NotImplementedError
+
+    async def retry(self, job_id, error, run_at):
+        """Release a failed job back to the queue, to run again at `run_at`."""
+        raise NotImplementedError
+
+    async def bury(self, job_id, error):
+        """Move a job to the dead-letter list."""
+        raise NotImplementedError
+
+    async def depth(self):
+        """Return {status: {kind: count}}, plus the age in seconds of the oldest ready job."""
+        raise NotImplementedError
+
+    async def dead_letters(self, limit=100):
+        raise NotImplementedError
+
+    async def requeue_dead(self, job_ids=None):
+        """Give dead jobs (all of them when job_ids is None) a fresh set of attempts; returns the count."""
+        raise NotImplementedError
+
+
+class SQLiteJobBackend(JobBackend):
+    """Job storage in a SQLite file, accessed from one dedicated thread like SQLiteAssessmentStore."""
+
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._conn = None
+        self._executor = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    async def open(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-backend")
+            await self._run(self._connect)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+        self._conn = None
+        self._executor = None
+
+    def _enqueue_many(self, jobs):
+        now = time.time()
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [
+                conn.execute(
+                    "INSERT INTO job (kind, payload, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (kind, json.dumps(payload), now, now, now),
+                ).lastrowid
+                for kind, payload in jobs
+            ]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    async def enqueue_many(self, jobs):
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        return await self._run(self._enqueue_many, jobs)
+
+    def _claim(self, kind, limit, lease_seconds):
+        now = time.time()
+        # Ready means queued and due, or running under a lease that has expired
+        rows = self._conn.execute(
+            "UPDATE job SET status = 'running', attempts = attempts + 1, locked_until = ?, updated_at = ? "
+            "WHERE id IN ("
+            "  SELECT id FROM job WHERE kind = ? AND ("
+            "    (status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until <= ?)"
+            "  ) ORDER BY run_at, id LIMIT ?"
+            ") RETURNING id, kind, payload, attempts",
+            (now + lease_seconds, now, kind, now, now, limit),
+        ).fetchall()
+        return sorted(
+            (Job(row["id"], row["kind"], json.loads(row["payload"]), row["attempts"]) for row in rows),
+            key=lambda job: job.id,
+        )
+
+    async def claim(self, kind, limit, lease_seconds):
+        return await self._run(self._claim, kind, limit, lease_seconds)
+
+    def _renew(self, job_ids, lease_seconds):
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE job SET locked_until = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            [(now + lease_seconds, now, job_id) for job_id in job_ids],
+        )
+
+    async def renew(self, job_ids, lease_seconds):
+        if job_ids:
+            await self._run(self._renew, list(job_ids), lease_seconds)
+
+    def _complete(self, job_ids):
+        self._conn.executemany("DELETE FROM job WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    async def complete(self, job_ids):
+        if job_ids:
+            await self._run(self._complete, list(job_ids))
+
+    def _retry(self, job_id, error, run_at):
+        self._conn.execute(
+            "UPDATE job SET status = 'queued', run_at = ?, locked_until = NULL, last_error = ?, updated_at = ? "
+            "WHERE id = ?",
+            (run_at, error, time.time(), job_id),
+        )
+
+    async def retry(self, job_id, error, run_at):
+        await self._run(self._retry, job_id, error, run_at)
+
+    def _bury(self, job_id, error):
+        self._conn.execute(
+            "UPDATE job SET status = 'dead', locked_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+            (error, time.time(), job_id),
+        )
+
+    async def bury(self, job_id, error):
+        await self._run(self._bury, job_id, error)
+
+    def _depth(self):
+        depth = {status: {} for status in STATUSES}
+        for row in self._conn.execute("SELECT status, kind, COUNT(*) FROM job GROUP BY status, kind"):
+            depth[row[0]][row[1]] = row[2]
+        (oldest,) = self._conn.execute(
+            "SELECT MIN(run_at) FROM job WHERE status = 'queued' AND run_at <= ?", (time.time(),)
+        ).fetchone()
+        depth["oldest_ready_seconds"] = round(time.time() - oldest, 3) if oldest is not None else 0.0
+        return depth
+
+    async def depth(self):
+        return await self._run(self._depth)
+
+    def _dead_letters(self, limit):
+        rows = self._conn.execute(
+            "SELECT id, kind, payload, attempts, last_error, created_at, updated_at FROM job "
+            "WHERE status = 'dead' ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "kind": row["kind"],
+                "payload": json.loads(row["payload"]),
+                "attempts": row["attempts"],
+                "last_error": row["last_error"],
+                "created_at": row["created_at"],
+                "failed_at": row["updated_at"],
+            }
+            for row in rows
+        ]
+
+    async def dead_letters(self, limit=100):
+        return await self._run(self._dead_letters, limit)
+
+    def _requeue_dead(self, job_ids):
+        now = time.time()
+        sql = "UPDATE job SET status = 'queued', attempts = 0, run_at = ?, updated_at = ? WHERE status = 'dead'"
+        if job_ids is None:
+            return self._conn.execute(sql, (now, now)).rowcount
+        return sum(
+            self._conn.execute(sql + " AND id = ?", (now, now, job_id)).rowcount for job_id in job_ids
+        )
+
+    async def requeue_dead(self, job_ids=None):
+        return await self._run(self._requeue_dead, job_ids)
+
+
+class JobQueue:
+    """Dispatches jobs from a backend to registered handlers on the running event loop."""
+
+    def __init__(self, backend, concurrency=4, max_attempts=5, backoff_base=2.0, backoff_max=600.0,
+                 lease_seconds=300.0, poll_interval=1.0):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        # Outcome counts since start, by (kind, outcome)
+        self.stats = {}
+        self._wakeup = None
+        self._dispatcher = None
+        self._stopping = False
+        self._running = set()
+        self._slots = None
+        # Enqueues waiting for the next group commit: (jobs, future for their ids or None)
+        self._pending = []
+        self._flush_task = None
+
+    def register(self, kind, fn, batch_size=1):
+        self.handlers[kind] = Handler(fn, batch_size)
+
+    async def enqueue(self, kind, payload):
+        return (await self.enqueue_many([(kind, payload)]))[0]
+
+    async def enqueue_many(self, jobs):
+        """Persist jobs and return their ids.
+
+        Enqueues from concurrent requests are grouped into one backend write:
+        whatever arrives while a write is in flight goes out in the next one.
+        """
+        jobs = self._checked(jobs)
+        if not jobs:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        self._queue_write(jobs, future)
+        return await future
+
+    def submit(self, jobs):
+        """Queue jobs for the next group commit without waiting for it.
+
+        For callers that must not block on, or fail because of, the job
+        backend: a failed write is logged with the job payloads instead of
+        raised.
+        """
+        jobs = self._checked(jobs)
+        if jobs:
+            self._queue_write(jobs, None)
+
+    def _checked(self, jobs):
+        jobs = list(jobs)
+        for kind, _ in jobs:
+            if kind not in self.handlers:
+                raise ValueError(f"No handler registered for job kind: {kind}")
+        return jobs
+
+    def _queue_write(self, jobs, future):
+        self._pending.append((jobs, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            while self._pending:
+                group, self._pending = self._pending, []
+                try:
+                    ids = await self.backend.enqueue_many([job for jobs, _ in group for job in jobs])
+                except Exception as e:
+                    for jobs, future in group:
+                        if future is None:
+                            logger.exception("Failed to enqueue jobs", extra={"fields": {
+                                "jobs": [{"kind": kind, "payload": payload} for kind, payload in jobs],
+                            }})
+                        elif not future.done():
+                            future.set_exception(e)
+                    continue
+                start = 0
+                for jobs, future in group:
+                    if future is not None and not future.done():
+                        future.set_result(ids[start:start + len(jobs)])
+                    start += len(jobs)
+                if self._wakeup is not None:
+                    self._wakeup.set()
+        finally:
+            self._flush_task = None
+
+    def backoff(self, attempts):
+        """Delay in seconds before retry number `attempts`, with up to 10% jitter."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * (1 + random.random() * 0.1)
+
+    def _count(self, kind, outcome, amount=1):
+        self.stats[(kind, outcome)] = self.stats.get((kind, outcome), 0) + amount
+
+    async def start(self):
+        await self.backend.open()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._stopping = False
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self, timeout=30.0):
+        """Stop claiming new jobs and wait up to `timeout` seconds for running batches.
+
+        Batches still running after the timeout are cancelled; their jobs are
+        retried by whichever worker next finds the lease expired.
+        """
+        if self._dispatcher is None:
+            return
+        # The flag as well as the cancel: before Python 3.12, wait_for can swallow a
+        # cancellation that arrives as its timeout fires, and the loop would go on polling
+        self._stopping = True
+        self._dispatcher.cancel()
+        try:
+            await self._dispatcher
+        except asyncio.CancelledError:
+            pass
+        self._dispatcher = None
+        if self._flush_task is not None:
+            # Jobs submitted without waiting still need to reach the backend
+            await self._flush_task
+        if self._running:
+            _, pending = await asyncio.wait(self._running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self.backend.close()
+
+    async def _dispatch(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            claimed_any = False
+            for kind, handler in self.handlers.items():
+                await self._slots.acquire()
+                try:
+                    jobs = await self.backend.claim(kind, handler.batch_size, self.lease_seconds)
+                except Exception:
+                    self._slots.release()
+                    logger.exception("Failed to claim jobs")
+                    continue
+                if not jobs:
+                    self._slots.release()
+                    continue
+                claimed_any = True
+                task = asyncio.create_task(self._run_batch(handler, kind, jobs))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            if not claimed_any:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _renew_leases(self, job_ids):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.backend.renew(job_ids, self.lease_seconds)
+            except Exception:
+                logger.exception("Failed to renew job leases", extra={"fields": {"jobs": len(job_ids)}})
+
+    async def _run_batch(self, handler, kind, jobs):
+        renewal = asyncio.create_task(self._renew_leases([job.id for job in jobs]))
+        try:
+            try:
+                failures = await handler.fn(jobs) or {}
+            except Exception as e:
+                logger.exception("Job batch failed", extra={"fields": {"kind": kind, "jobs": len(jobs)}})
+                failures = {job.id: f"{type(e).__name__}: {e}" for job in jobs}
+            finally:
+                renewal.cancel()
+            # Errors are persisted and logged; SMTP errors in particular quote recipient addresses
+            failures = {job_id: EMAIL_PATTERN.sub(REDACTED, str(error)) for job_id, error in failures.items()}
+
+            await self.backend.complete([job.id for job in jobs if job.id not in failures])
+            self._count(kind, "succeeded", len(jobs) - len(failures))
+            for job in jobs:
+                error = failures.get(job.id)
+                if error is None:
+                    continue
+                if job.attempts >= self.max_attempts:
+                    await self.backend.bury(job.id, error)
+                    self._count(kind, "dead")
+                    logger.error("Job moved to dead-letter list", extra={"fields": {
+                        "job_id": job.id, "kind": kind, "attempts": job.attempts, "error": error,
+                    }})
+                else:
+                    await self.backend.retry(job.id, error, time.time() + self.backoff(job.attempts))
+                    self._count(kind, "retried")
+        finally:
+            self._slots.release()
+            # A finished batch may mean more work of this kind is ready
+            self._wakeup.set()
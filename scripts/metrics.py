@@ -0,0 +1,211 @@
+import contextvars
+import os
+import time
+from bisect import bisect_left
+
+
+# Latency buckets in seconds; the scoring phases sit in the microsecond range
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram. observe() is one bisect and a few list updates."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last slot is +Inf), sum, count]
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else _format_value(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """Metric whose samples are read from `callback` at scrape time.
+
+    The callback returns a dict mapping label-value tuples to numbers.
+    """
+
+    def __init__(self, name, help, type, labels, callback):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = tuple(labels)
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for label_values, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("method", "route", "status")))
+phase_duration = registry.register(Histogram(
+    "assessment_phase_duration_seconds",
+    "Time spent in each phase of assessment handling.", ("endpoint", "phase")))
+submissions_by_risk = registry.register(Counter(
+    "assessment_submissions_total", "Stored assessments by overall risk level.", ("overall_risk",)))
+flagged_domains = registry.register(Counter(
+    "assessment_flagged_domains_total", "Stored assessments by flagged domain.", ("domain",)))
+
+
+# Tracing adds a per-request Server-Timing header with the phase breakdown
+tracing_enabled = os.environ.get("ASSESSMENT_TRACING", "0") == "1"
+
+
+def set_tracing(enabled):
+    global tracing_enabled
+    tracing_enabled = bool(enabled)
+
+
+class RequestTimer:
+    """Splits one request's time into named phases.
+
+    Each mark() records the time since the previous mark (or since the request
+    started) under the given phase name.
+    """
+
+    __slots__ = ("last", "phases")
+
+    def __init__(self, started):
+        self.last = started
+        self.phases = []
+
+    def mark(self, endpoint, phase):
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+        phase_duration.observe(elapsed, endpoint, phase)
+        if tracing_enabled:
+            self.phases.append((phase, elapsed))
+
+
+_current_timer = contextvars.ContextVar("assessment_request_timer", default=None)
+
+
+def mark_phase(endpoint, phase):
+    """Record the end of `phase` for the current request (no-op outside MetricsMiddleware)."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.mark(endpoint, phase)
+
+
+def record_assessment(overall_risk, domains):
+    submissions_by_risk.inc(overall_risk)
+    for domain in domains:
+        flagged_domains.inc(domain)
+
+
+def server_timing_header(phases):
+    return ", ".join(f"{phase};dur={elapsed * 1000:.3f}" for phase, elapsed in phases)
+
+
+class MetricsMiddleware:
+    """ASGI middleware that times every HTTP request and exposes a RequestTimer to handlers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timer = RequestTimer(started)
+        token = _current_timer.set(timer)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if tracing_enabled:
+                    timings = [*timer.phases, ("total", time.perf_counter() - started)]
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", server_timing_header(timings).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_timer.reset(token)
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
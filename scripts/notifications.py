@@ -0,0 +1,423 @@
+"""Post-submission side effects, run as jobs on the JobQueue.
+
+- report_email: renders templates/report-email.html and sends it to the
+  parent. One SMTP connection is opened per batch of emails.
+- crm_lead: creates a lead (with partner and risk tags) in Odoo over
+  JSON-RPC. One authentication and tag lookup is done per batch.
+
+Job payloads carry only the assessment id and instrument version; the record
+is read back from the store when the job runs, so no personal data is kept
+in the job queue.
+
+Configuration follows the Next.js routes: SMTP_HOST, SMTP_PORT, SMTP_USER,
+SMTP_PASS, SMTP_FROM and ODOO_URL, ODOO_DB, ODOO_USERNAME, ODOO_PASSWORD.
+Without SMTP_HOST emails are logged instead of sent; without the Odoo
+settings the CRM sync is skipped.
+"""
+import asyncio
+import html
+import json
+import os
+import re
+import smtplib
+import urllib.request
+from datetime import datetime
+from email.message import EmailMessage
+from functools import lru_cache
+
+from assessment_logic import load_instrument
+from audit_log import logger
+
+
+REPORT_EMAIL = "report_email"
+CRM_LEAD = "crm_lead"
+
+EMAIL_BATCH_SIZE = 50
+CRM_BATCH_SIZE = 20
+
+TEMPLATES_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "templates"))
+REPORT_TEMPLATE = os.path.join(TEMPLATES_DIR, "report-email.html")
+
+# Highest answer value; a domain's maximum score is this times its question count
+MAX_ANSWER = 4
+
+SMTP_TIMEOUT = 30
+ODOO_TIMEOUT = 15
+
+ANSWER_LABELS = {
+    "1": "Never/Rarely",
+    "2": "Sometimes",
+    "3": "Often",
+    "4": "Always/Very Frequently",
+}
+
+
+def submission_jobs(assessment_id, instrument_version):
+    """The jobs to enqueue for one stored submission."""
+    payload = {"assessment_id": assessment_id, "instrument": instrument_version}
+    return [(REPORT_EMAIL, payload), (CRM_LEAD, payload)]
+
+
+# Mustache subset used by the email template: {{name}}, {{{raw}}}, {{&raw}},
+# {{.}}, {{#section}}...{{/section}} and {{^inverted}}...{{/inverted}}
+MUSTACHE_TAG = re.compile(r"\{\{(\{?)\s*([#^/&]?)\s*([\w.-]+)\s*\}?\}\}")
+
+
+def compile_mustache(source):
+    """Parse a template into nested (kind, name, children) nodes; text nodes are plain strings."""
+    root = []
+    stack = [(None, root)]
+    position = 0
+    for match in MUSTACHE_TAG.finditer(source):
+        nodes = stack[-1][1]
+        if match.start() > position:
+            nodes.append(source[position:match.start()])
+        position = match.end()
+        triple, sigil, name = match.groups()
+        if sigil in ("#", "^"):
+            children = []
+            nodes.append((sigil, name, children))
+            stack.append((name, children))
+        elif sigil == "/":
+            if stack[-1][0] != name:
+                raise ValueError(f"Unexpected closing tag {{{{/{name}}}}}")
+            stack.pop()
+        else:
+            nodes.append(("raw" if triple or sigil == "&" else "var", name, None))
+    if len(stack) > 1:
+        raise ValueError(f"Unclosed section {{{{#{stack[-1][0]}}}}}")
+    if position < len(source):
+        root.append(source[position:])
+    return root
+
+
+def _lookup(contexts, name):
+    if name == ".":
+        return contexts[-1]
+    for context in reversed(contexts):
+        if isinstance(context, dict) and name in context:
+            return context[name]
+    return None
+
+
+def render_mustache(nodes, contexts):
+    out = []
+    for node in nodes:
+        if isinstance(node, str):
+            out.append(node)
+            continue
+        kind, name, children = node
+        value = _lookup(contexts, name)
+        if kind == "var":
+            out.append(html.escape(str(value)) if value is not None else "")
+        elif kind == "raw":
+            out.append(str(value) if value is not None else "")
+        elif kind == "^":
+            if not value:
+                out.append(render_mustache(children, contexts))
+        elif isinstance(value, (list, tuple)):
+            out.extend(render_mustache(children, [*contexts, item]) for item in value)
+        elif value:
+            out.append(render_mustache(children, [*contexts, value]))
+    return "".join(out)
+
+
+@lru_cache(maxsize=4)
+def _load_template(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        return compile_mustache(f.read())
+
+
+def load_template(path=REPORT_TEMPLATE):
+    return _load_template(path, os.stat(path).st_mtime_ns)
+
+
+def domain_max_scores(instrument):
+    maxima = dict.fromkeys(instrument.domains, 0)
+    for domain_index, weight in instrument.question_table.values():
+        maxima[instrument.domains[domain_index]] += MAX_ANSWER * abs(weight)
+    return maxima
+
+
+def report_context(record, instrument):
+    """Template data for one stored record, matching the send-report route's fields."""
+    data, result = record["data"], record["result"]
+    flagged = result["flagged_domains"]
+    maxima = domain_max_scores(instrument)
+    created = datetime.fromisoformat(record["timestamp"])
+    domains = []
+    for domain, score in record["domain_scores"].items():
+        max_score = maxima.get(domain) or 1
+        is_flagged = domain in flagged
+        domains.append({
+            "name": domain,
+            "score": score,
+            "maxScore": max_score,
+            "percentage": round(score / max_score * 100),
+            "isFlagged": is_flagged,
+            "status": "⚠️ Needs attention" if is_flagged else "✅ Within range",
+            "barClass": "score-high" if is_flagged else "score-low",
+            "cardClass": "domain-flagged" if is_flagged else "",
+        })
+    return {
+        "name": data["name"],
+        "email": data["email"],
+        "age": data["age"],
+        "date": f"{created:%B} {created.day}, {created.year}",
+        "overallRisk": result["overall_risk"],
+        "overallRiskLower": result["overall_risk"].lower(),
+        "overallRiskUpper": result["overall_risk"].upper(),
+        "domains": domains,
+        "hasFlaggedDomains": bool(flagged),
+        "flaggedCount": len(flagged),
+        "detailed_message": result["detailed_message"],
+        "recommendations": result["recommendations"],
+    }
+
+
+def build_report_email(record, instrument, sender, template=None):
+    context = report_context(record, instrument)
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = context["email"]
+    message["Subject"] = f"Your Child's Developmental Screening Results - {context['overallRisk']} Risk Level"
+    message.set_content("Your child's developmental screening results are included in the HTML version of this email.")
+    message.add_alternative(render_mustache(template or load_template(), [context]), subtype="html")
+    return message
+
+
+class SMTPSettings:
+    def __init__(self, host, port=587, user=None, password=None, sender=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender or f'"Developmental Screening" <{user}>'
+
+    @classmethod
+    def from_env(cls):
+        host = os.environ.get("SMTP_HOST")
+        if not host:
+            return None
+        return cls(
+            host,
+            int(os.environ.get("SMTP_PORT") or 587),
+            os.environ.get("SMTP_USER"),
+            os.environ.get("SMTP_PASS"),
+            os.environ.get("SMTP_FROM"),
+        )
+
+
+def send_emails(settings, messages):
+    """Send (job_id, EmailMessage) pairs over one SMTP connection; returns {job_id: error}.
+
+    Errors before the first message (connecting, TLS, login) are raised, as
+    nothing has been sent. Once sending has started, errors are returned per
+    job so that messages already delivered are never retried.
+    """
+    failures = {}
+    smtp_class = smtplib.SMTP_SSL if settings.port == 465 else smtplib.SMTP
+    smtp = smtp_class(settings.host, settings.port, timeout=SMTP_TIMEOUT)
+    try:
+        if smtp_class is smtplib.SMTP:
+            smtp.ehlo()
+            if smtp.has_extn("starttls"):
+                smtp.starttls()
+                smtp.ehlo()
+        if settings.user:
+            smtp.login(settings.user, settings.password or "")
+        for position, (job_id, message) in enumerate(messages):
+            try:
+                smtp.send_message(message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                # Refused by the server; the connection is still usable for the rest
+                failures[job_id] = f"{type(e).__name__}: {e}"
+            except Exception as e:
+                # Disconnects, timeouts and protocol errors leave the connection unusable:
+                # this message and the rest of the batch fail, the ones already sent must not
+                failures.update({
+                    queued_id: f"{type(e).__name__}: {e}" for queued_id, _ in messages[position:]
+                })
+                break
+    finally:
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+    return failures
+
+
+class OdooSettings:
+    def __init__(self, url, db, username, password):
+        self.url = url.rstrip("/")
+        self.db = db
+        self.username = username
+        self.password = password
+
+    @classmethod
+    def from_env(cls):
+        values = [os.environ.get(name) for name in ("ODOO_URL", "ODOO_DB", "ODOO_USERNAME", "ODOO_PASSWORD")]
+        return cls(*values) if all(values) else None
+
+
+class OdooClient:
+    """Blocking Odoo JSON-RPC client; one instance serves one batch."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.uid = None
+        self._tags = {}
+
+    def rpc(self, service, method, *args):
+        body = json.dumps({
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {"service": service, "method": method, "args": list(args)},
+            "id": 1,
+        }).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.settings.url}/jsonrpc", data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=ODOO_TIMEOUT) as response:
+            reply = json.loads(response.read())
+        if reply.get("error"):
+            raise RuntimeError(f"Odoo RPC error in {service}.{method}: {reply['error'].get('message')}")
+        return reply.get("result")
+
+    def execute(self, model, method, *args, **kwargs):
+        s = self.settings
+        return self.rpc("object", "execute_kw", s.db, self.uid, s.password, model, method, list(args), kwargs)
+
+    def authenticate(self):
+        s = self.settings
+        uid = self.rpc("common", "authenticate", s.db, s.username, s.password, {})
+        if not isinstance(uid, int) or isinstance(uid, bool):
+            raise RuntimeError("Odoo authentication failed")
+        self.uid = uid
+
+    def ensure_tag(self, name):
+        if name not in self._tags:
+            existing = self.execute("crm.tag", "search_read", [["name", "=", name]], fields=["id"], limit=1)
+            self._tags[name] = existing[0]["id"] if existing else self.execute("crm.tag", "create", [{"name": name}])
+        return self._tags[name]
+
+    def ensure_partner(self, email, name):
+        existing = self.execute("res.partner", "search_read", [["email", "ilike", email]], fields=["id"], limit=1)
+        if existing:
+            return existing[0]["id"]
+        return self.execute("res.partner", "create", [{"name": name, "email": email}])
+
+    def create_lead(self, lead):
+        return self.execute("crm.lead", "create", [lead])
+
+
+def lead_description(record, instrument):
+    """Internal-notes HTML for the lead, as built by the submit-assessment route."""
+    e = html.escape
+    data, result = record["data"], record["result"]
+    maxima = domain_max_scores(instrument)
+    score_rows = "".join(
+        f"<tr><td>{e(domain)}</td><td>{score}</td><td>{maxima.get(domain, 0)}</td>"
+        f"<td>{'Needs attention' if domain in result['flagged_domains'] else 'Within range'}</td></tr>"
+        for domain, score in record["domain_scores"].items()
+    )
+    responses = "".join(
+        f"<li><b>{e(instrument.questions[key]['question'])}:</b> "
+        f"{e(ANSWER_LABELS.get(data.get(key) or '', data.get(key) or 'N/A'))}</li>"
+        for key in instrument.question_keys
+    )
+    recommendations = "".join(f"<li>{e(item)}</li>" for item in result["recommendations"]) or "<li>None</li>"
+    flagged = e(", ".join(result["flagged_domains"])) or "None"
+    return (
+        f'<h3 style="margin:0 0 6px 0;">Developmental Screening</h3>'
+        f'<p style="margin:0 0 12px 0;"><b>Overall Risk:</b> {e(result["overall_risk"])}</p>'
+        f'<h4 style="margin:12px 0 6px 0;">Personal Info</h4>'
+        f'<ul style="margin:0 0 12px 18px; padding:0;">'
+        f'<li><b>Name:</b> {e(data["name"])}</li><li><b>Email:</b> {e(data["email"])}</li>'
+        f'<li><b>Age:</b> {data["age"]}</li><li><b>Marital Status:</b> {e(data["marital_status"])}</li></ul>'
+        f'<h4 style="margin:12px 0 6px 0;">Assessment Summary</h4>'
+        f'<ul style="margin:0 0 12px 18px; padding:0;"><li><b>Flagged Domains:</b> {flagged}</li>'
+        f'<li><b>Message:</b> {e(result["message"])}</li><li><b>Details:</b> {e(result["detailed_message"])}</li></ul>'
+        f'<h4 style="margin:12px 0 6px 0;">Domain Scores</h4>'
+        f'<table border="1" cellpadding="6" cellspacing="0" style="border-collapse:collapse; margin:0 0 12px 0;">'
+        f'<thead><tr><th>Domain</th><th>Score</th><th>Maximum</th><th>Status</th></tr></thead>'
+        f'<tbody>{score_rows}</tbody></table>'
+        f'<h4 style="margin:12px 0 6px 0;">Recommendations</h4>'
+        f'<ul style="margin:0 0 12px 18px; padding:0;">{recommendations}</ul>'
+        f'<h4 style="margin:12px 0 6px 0;">Responses</h4>'
+        f'<ul style="margin:0 0 12px 18px; padding:0;">{responses}</ul>'
+    )
+
+
+def sync_leads(settings, leads):
+    """Create (job_id, record, instrument) leads with one Odoo session; returns {job_id: error}."""
+    client = OdooClient(settings)
+    client.authenticate()
+    failures = {}
+    for job_id, record, instrument in leads:
+        data = record["data"]
+        try:
+            tag_ids = [
+                client.ensure_tag("adhd_assessment"),
+                client.ensure_tag(f"risk_{record['result']['overall_risk'].lower()}"),
+            ]
+            lead = {
+                "name": f"Developmental Screening - {data['name']}",
+                "contact_name": data["name"],
+                "email_from": data["email"],
+                "tag_ids": [[6, 0, tag_ids]],
+                "description": lead_description(record, instrument),
+            }
+            partner_id = client.ensure_partner(data["email"], data["name"])
+            if partner_id:
+                lead["partner_id"] = partner_id
+            client.create_lead(lead)
+        except Exception as e:
+            failures[job_id] = f"{type(e).__name__}: {e}"
+    return failures
+
+
+async def _load_records(store, jobs):
+    """Pair each job with its stored record and instrument, skipping deleted assessments."""
+    loaded = []
+    for job in jobs:
+        record = await store.get(job.payload["assessment_id"])
+        if record is None:
+            logger.warning("Skipping job for missing assessment", extra={"fields": {
+                "job_id": job.id, "kind": job.kind, "assessment_id": job.payload["assessment_id"],
+            }})
+            continue
+        loaded.append((job.id, record, load_instrument(job.payload["instrument"])))
+    return loaded
+
+
+def register(queue, store):
+    """Register the report_email and crm_lead handlers on `queue`, reading records from `store`."""
+
+    async def report_emails(jobs):
+        settings = SMTPSettings.from_env()
+        loaded = await _load_records(store, jobs)
+        if settings is None:
+            for job_id, record, _ in loaded:
+                logger.info("Email report not sent (SMTP_HOST not set)", extra={"fields": {
+                    "job_id": job_id, "assessment_id": record["id"], "overall_risk": record["result"]["overall_risk"],
+                }})
+            return {}
+        if not loaded:
+            return {}
+        template = load_template()
+        messages = [(job_id, build_report_email(record, instrument, settings.sender, template))
+                    for job_id, record, instrument in loaded]
+        return await asyncio.to_thread(send_emails, settings, messages)
+
+    async def crm_leads(jobs):
+        settings = OdooSettings.from_env()
+        if settings is None:
+            logger.warning("Skipping CRM sync, Odoo environment variables not configured",
+                           extra={"fields": {"jobs": len(jobs)}})
+            return {}
+        loaded = await _load_records(store, jobs)
+        return await asyncio.to_thread(sync_leads, settings, loaded)
+
+    queue.register(REPORT_EMAIL, report_emails, batch_size=EMAIL_BATCH_SIZE)
+    queue.register(CRM_LEAD, crm_leads, batch_size=CRM_BATCH_SIZE)
@@ -0,0 +1,132 @@
+"""Production launcher for the assessment API.
+
+Unlike run_server.py this never installs dependencies; it starts N worker
+processes serving backend:app and exits when they do.
+
+    python serve.py --workers 4 --port 8000
+
+With gunicorn installed, the app is imported once in the master
+(preload_app) and forked into UvicornWorker processes, so workers start
+without re-importing anything and share the loaded code pages. Without
+gunicorn, uvicorn's own process manager is used and each worker imports the
+app itself. uvloop and httptools are used whenever they are installed.
+
+State shared between workers lives in the database: assessment ids come
+from SQLite AUTOINCREMENT and the cohort counters are updated in the insert
+transaction, so both stay correct with any number of workers. Prometheus
+metrics and the result cache are per worker. Log sinks that append to one
+file are safe to share (each batch is a single append); rotating sinks are
+not, so give each deployment its own rotating file or log to stdout.
+
+Settings default to environment variables: WEB_CONCURRENCY, HOST, PORT,
+ASSESSMENT_BACKLOG, ASSESSMENT_KEEP_ALIVE, ASSESSMENT_GRACEFUL_TIMEOUT.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+
+APP = "backend:app"
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_workers():
+    return int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+
+def available(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def event_loop():
+    return "uvloop" if available("uvloop") else "asyncio"
+
+
+def http_protocol():
+    return "httptools" if available("httptools") else "h11"
+
+
+def serve_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                # UvicornWorker picks uvloop/httptools itself when they are installed
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": True,
+                "backlog": args.backlog,
+                "keepalive": args.keep_alive,
+                "graceful_timeout": args.graceful_timeout,
+                "accesslog": "-" if args.access_log else None,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import backend
+            return backend.app
+
+    Application().run()
+
+
+def serve_uvicorn(args):
+    import uvicorn
+
+    if args.workers > 1:
+        # Multiple workers need an import string; each worker process imports it
+        app = APP
+    else:
+        import backend
+        app = backend.app
+
+    uvicorn.run(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=args.access_log,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the assessment API with multiple workers")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--backlog", type=int, default=int(os.environ.get("ASSESSMENT_BACKLOG", 2048)),
+                        help="pending connections the listen socket holds")
+    parser.add_argument("--keep-alive", type=int, default=int(os.environ.get("ASSESSMENT_KEEP_ALIVE", 5)),
+                        help="seconds to hold idle keep-alive connections open")
+    parser.add_argument("--graceful-timeout", type=int,
+                        default=int(os.environ.get("ASSESSMENT_GRACEFUL_TIMEOUT", 30)),
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--access-log", action="store_true", help="log every request (costs throughput)")
+    parser.add_argument("--server", choices=("auto", "gunicorn", "uvicorn"), default="auto")
+    args = parser.parse_args()
+
+    # backend and its modules import each other by plain name
+    os.chdir(SCRIPTS_DIR)
+    sys.path.insert(0, SCRIPTS_DIR)
+
+    server = args.server
+    if server == "auto":
+        server = "gunicorn" if available("gunicorn") else "uvicorn"
+    print(f"Serving {APP} on http://{args.host}:{args.port} with {args.workers} {server} worker(s) "
+          f"({event_loop()}, {http_protocol()})")
+    if server == "gunicorn":
+        serve_gunicorn(args)
+    else:
+        serve_uvicorn(args)
+
+
+if __name__ == "__main__":
+    main()
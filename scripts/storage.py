@@ -0,0 +1,482 @@
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Column names follow the ADHDAssessment model in prisma/schema.prisma (table adhd_assessment),
+# including detailedMessage, which that model leaves unmapped.
+# The score columns hold the domains below for SQL aggregation; the domain_scores
+# JSON column holds each record's scores exactly as its questionnaire version defines them.
+SCORE_COLUMNS = {
+    "Behavioral": "behavioral_score",
+    "Cognitive/Attention": "cognitive_score",
+    "Motor Skills": "motor_skills_score",
+    "Language/Academic": "language_score",
+}
+
+# Personal info fields on the request model; everything else in `data` is a screening response
+PERSONAL_FIELDS = {
+    "name": "full_name",
+    "email": "email",
+    "age": "age",
+    "marital_status": "marital_status",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS adhd_assessment (
+    id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at         TEXT    NOT NULL,
+    updated_at         TEXT    NOT NULL,
+    full_name          TEXT    NOT NULL,
+    email              TEXT    NOT NULL,
+    phone              TEXT,
+    consent_given      INTEGER NOT NULL DEFAULT 0,
+    consent_timestamp  TEXT,
+    age                INTEGER NOT NULL,
+    marital_status     TEXT    NOT NULL,
+    medical_conditions TEXT    NOT NULL DEFAULT '[]',
+    medications        TEXT,
+    family_history     TEXT,
+    responses          TEXT    NOT NULL,
+    behavioral_score   INTEGER NOT NULL DEFAULT 0,
+    cognitive_score    INTEGER NOT NULL DEFAULT 0,
+    motor_skills_score INTEGER NOT NULL DEFAULT 0,
+    language_score     INTEGER NOT NULL DEFAULT 0,
+    overall_risk       TEXT    NOT NULL CHECK (overall_risk IN ('Low', 'Moderate', 'High')),
+    flagged_domains    TEXT    NOT NULL DEFAULT '[]',
+    message            TEXT    NOT NULL DEFAULT '',
+    detailedMessage    TEXT    NOT NULL DEFAULT '',
+    recommendations    TEXT    NOT NULL DEFAULT '[]',
+    assessment_type    TEXT    NOT NULL DEFAULT 'developmental_screening',
+    completed_at       TEXT,
+    lead_status        TEXT    NOT NULL DEFAULT 'new',
+    lead_source        TEXT    NOT NULL DEFAULT 'adhd_assessment',
+    follow_up_notes    TEXT,
+    instrument_version TEXT    NOT NULL DEFAULT 'v1',
+    domain_scores      TEXT
+);
+CREATE INDEX IF NOT EXISTS adhd_assessment_created_at_idx ON adhd_assessment (created_at);
+CREATE INDEX IF NOT EXISTS adhd_assessment_email_idx ON adhd_assessment (email);
+CREATE INDEX IF NOT EXISTS adhd_assessment_overall_risk_idx ON adhd_assessment (overall_risk);
+CREATE INDEX IF NOT EXISTS adhd_assessment_instrument_version_idx ON adhd_assessment (instrument_version, id);
+CREATE TABLE IF NOT EXISTS cohort_counters (
+    key   TEXT    PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+# Questionnaire version of records stored before the version was recorded
+LEGACY_INSTRUMENT_VERSION = "v1"
+
+# Columns added after the first release, with their definitions, for existing databases
+ADDED_COLUMNS = {
+    "instrument_version": f"TEXT NOT NULL DEFAULT '{LEGACY_INSTRUMENT_VERSION}'",
+    "domain_scores": "TEXT",
+}
+
+# Columns renamed after the first release, old name to new, for existing databases
+RENAMED_COLUMNS = {
+    "detailed_message": "detailedMessage",
+}
+
+UPSERT_COUNTER_SQL = (
+    "INSERT INTO cohort_counters (key, count) VALUES (?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET count = count + excluded.count"
+)
+
+INSERT_COLUMNS = (
+    "created_at", "updated_at", "full_name", "email", "age", "marital_status", "responses",
+    *SCORE_COLUMNS.values(),
+    "overall_risk", "flagged_domains", "message", "detailedMessage", "recommendations", "completed_at",
+    "instrument_version", "domain_scores",
+)
+
+INSERT_SQL = (
+    f"INSERT INTO adhd_assessment ({', '.join(INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in INSERT_COLUMNS)})"
+)
+
+RECORD_FIELDS = ("id", "timestamp", "instrument", "data", "domain_scores", "result")
+
+# Columns needed to build each top-level record field, used for projection
+FIELD_COLUMNS = {
+    "id": ("id",),
+    "timestamp": ("created_at",),
+    "instrument": ("instrument_version",),
+    "data": (*PERSONAL_FIELDS.values(), "responses"),
+    "domain_scores": (*SCORE_COLUMNS.values(), "domain_scores"),
+    "result": (
+        "overall_risk", *SCORE_COLUMNS.values(), "domain_scores",
+        "flagged_domains", "message", "detailedMessage", "recommendations",
+    ),
+}
+
+SELECT_COLUMNS = tuple(dict.fromkeys(column for columns in FIELD_COLUMNS.values() for column in columns))
+
+RISK_LEVELS = ("Low", "Moderate", "High")
+
+
+def select_columns(fields):
+    """Columns to SELECT for a projection; id is always included for cursoring."""
+    return tuple(dict.fromkeys(column for field in ("id", *fields) for column in FIELD_COLUMNS[field]))
+
+
+def build_where(filters):
+    """Translate an assessment filter dict into a WHERE clause and its parameters.
+
+    Supported keys: instrument (questionnaire version), risk, flagged_domain,
+    created_from, created_to (naive local ISO timestamps, inclusive), min_age,
+    max_age (inclusive), after_id (keyset cursor) and until_id (inclusive upper
+    id bound). Keys whose value is None are ignored.
+    """
+    clauses = []
+    params = []
+
+    if filters.get("after_id") is not None:
+        clauses.append("id > ?")
+        params.append(filters["after_id"])
+    if filters.get("until_id") is not None:
+        clauses.append("id <= ?")
+        params.append(filters["until_id"])
+    if filters.get("instrument") is not None:
+        clauses.append("instrument_version = ?")
+        params.append(filters["instrument"])
+    if filters.get("risk") is not None:
+        clauses.append("overall_risk = ?")
+        params.append(filters["risk"])
+    if filters.get("flagged_domain") is not None:
+        clauses.append("EXISTS (SELECT 1 FROM json_each(flagged_domains) WHERE json_each.value = ?)")
+        params.append(filters["flagged_domain"])
+    if filters.get("created_from") is not None:
+        clauses.append("created_at >= ?")
+        params.append(filters["created_from"])
+    if filters.get("created_to") is not None:
+        clauses.append("created_at <= ?")
+        params.append(filters["created_to"])
+    if filters.get("min_age") is not None:
+        clauses.append("age >= ?")
+        params.append(filters["min_age"])
+    if filters.get("max_age") is not None:
+        clauses.append("age <= ?")
+        params.append(filters["max_age"])
+
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+ID_PREFIX = "assessment_"
+
+
+def format_assessment_id(row_id):
+    return f"{ID_PREFIX}{row_id}"
+
+
+def parse_assessment_id(assessment_id):
+    """Return the integer row id for an `assessment_<n>` id, or None if malformed."""
+    if not assessment_id.startswith(ID_PREFIX):
+        return None
+    try:
+        return int(assessment_id[len(ID_PREFIX):])
+    except ValueError:
+        return None
+
+
+def record_to_row(record):
+    """Flatten an assessment record (timestamp/data/domain_scores/result) into INSERT_COLUMNS order."""
+    data = record["data"]
+    result = record["result"]
+    domain_scores = record["domain_scores"]
+    responses = {key: value for key, value in data.items() if key not in PERSONAL_FIELDS}
+
+    return (
+        record["timestamp"],
+        record["timestamp"],
+        data["name"],
+        data["email"],
+        data["age"],
+        data["marital_status"],
+        json.dumps(responses),
+        *(domain_scores.get(domain, 0) for domain in SCORE_COLUMNS),
+        result["overall_risk"],
+        json.dumps(list(result["flagged_domains"])),
+        result["message"],
+        result["detailed_message"],
+        json.dumps(list(result["recommendations"])),
+        record["timestamp"],
+        record["instrument"],
+        json.dumps(domain_scores),
+    )
+
+
+def row_to_record(row, fields=RECORD_FIELDS):
+    """Rebuild the API record shape from a row, keeping only the requested fields."""
+    record = {}
+    domain_scores = None
+    if "domain_scores" in fields or "result" in fields:
+        if row["domain_scores"] is not None:
+            domain_scores = json.loads(row["domain_scores"])
+        else:
+            # Stored before per-version scores were kept; those were all scored with SCORE_COLUMNS' domains
+            domain_scores = {domain: row[column] for domain, column in SCORE_COLUMNS.items()}
+
+    if "id" in fields:
+        record["id"] = format_assessment_id(row["id"])
+    if "timestamp" in fields:
+        record["timestamp"] = row["created_at"]
+    if "instrument" in fields:
+        record["instrument"] = row["instrument_version"]
+    if "data" in fields:
+        data = {field: row[column] for field, column in PERSONAL_FIELDS.items()}
+        data.update(json.loads(row["responses"]))
+        record["data"] = data
+    if "domain_scores" in fields:
+        record["domain_scores"] = domain_scores
+    if "result" in fields:
+        record["result"] = {
+            "overall_risk": row["overall_risk"],
+            "domain_scores": domain_scores,
+            "flagged_domains": json.loads(row["flagged_domains"]),
+            "message": row["message"],
+            "detailed_message": row["detailedMessage"],
+            "recommendations": json.loads(row["recommendations"]),
+        }
+
+    return record
+
+
+class AssessmentStore:
+    """Async interface for persisting assessment records.
+
+    Records use the same shape the API has always returned: `id`, `timestamp`,
+    `data`, `domain_scores` and `result`, plus `instrument`, the questionnaire
+    version the record was scored with. The store assigns the id.
+    """
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def add(self, record):
+        """Persist a record and return its assigned id."""
+        raise NotImplementedError
+
+    async def add_many(self, records):
+        """Persist records in a single transaction and return their ids in order."""
+        raise NotImplementedError
+
+    async def get(self, assessment_id):
+        raise NotImplementedError
+
+    async def read_counters(self):
+        """Return the running cohort counters as a {key: count} dict."""
+        raise NotImplementedError
+
+    async def replace_counters(self, counts, high_water_id):
+        """Replace the running counters with a recomputation covering ids <= high_water_id."""
+        raise NotImplementedError
+
+    async def max_id(self):
+        """Largest row id currently stored (0 when empty)."""
+        raise NotImplementedError
+
+    async def count(self, filters=None):
+        raise NotImplementedError
+
+    async def score_histogram(self, filters=None):
+        """Return [(scores in SCORE_COLUMNS order, number of matching records)] for each distinct score row."""
+        raise NotImplementedError
+
+    async def page(self, filters=None, fields=RECORD_FIELDS, limit=100):
+        """Return (records, next_cursor) for one keyset page ordered by id.
+
+        Pass the previous page's next_cursor back as filters["after_id"];
+        next_cursor is None on the last page.
+        """
+        raise NotImplementedError
+
+    async def iter_records(self, filters=None, fields=RECORD_FIELDS, chunk_size=500):
+        """Yield matching records in id order, fetching chunk_size rows at a time."""
+        filters = dict(filters or {})
+        while True:
+            records, next_cursor = await self.page(filters, fields, chunk_size)
+            for record in records:
+                yield record
+            if next_cursor is None:
+                return
+            filters["after_id"] = next_cursor
+
+
+class SQLiteAssessmentStore(AssessmentStore):
+    """SQLite store in WAL mode.
+
+    All database work runs on a single dedicated thread, so the event loop is
+    never blocked and the connection is only ever used from one thread. Ids come
+    from the AUTOINCREMENT primary key, which stays unique when several worker
+    processes share the same database file.
+
+    `counters`, when given, maps a record to {counter key: delta}. The deltas
+    are added to the cohort_counters table in the same transaction as the
+    insert, so the counters stay exact across workers.
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000, counters=None):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.counters = counters
+        self._conn = None
+        self._executor = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(adhd_assessment)")}
+        if existing:
+            for old, new in RENAMED_COLUMNS.items():
+                if old in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE adhd_assessment RENAME COLUMN {old} TO {new}")
+                    except sqlite3.OperationalError as e:
+                        # Another worker opening the same database renamed it first
+                        if "no such column" not in str(e):
+                            raise
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE adhd_assessment ADD COLUMN {column} {definition}")
+                    except sqlite3.OperationalError as e:
+                        # Another worker opening the same database added it first
+                        if "duplicate column" not in str(e):
+                            raise
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    async def open(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assessment-store")
+            await self._run(self._connect)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+        self._conn = None
+        self._executor = None
+
+    def _counter_deltas(self, records):
+        deltas = {}
+        if self.counters is not None:
+            for record in records:
+                for key, delta in self.counters(record).items():
+                    deltas[key] = deltas.get(key, 0) + delta
+        return deltas
+
+    def _add_many(self, rows, deltas):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [format_assessment_id(conn.execute(INSERT_SQL, row).lastrowid) for row in rows]
+            if deltas:
+                conn.executemany(UPSERT_COUNTER_SQL, deltas.items())
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return ids
+
+    async def add(self, record):
+        ids = await self._run(self._add_many, [record_to_row(record)], self._counter_deltas([record]))
+        return ids[0]
+
+    async def add_many(self, records):
+        if not records:
+            return []
+        rows = [record_to_row(record) for record in records]
+        return await self._run(self._add_many, rows, self._counter_deltas(records))
+
+    def _read_counters(self):
+        return dict(self._conn.execute("SELECT key, count FROM cohort_counters").fetchall())
+
+    async def read_counters(self):
+        return await self._run(self._read_counters)
+
+    def _replace_counters(self, counts, high_water_id):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Rows inserted while the recomputation was streaming are counted here, under the write lock
+            counts = dict(counts)
+            if self.counters is not None:
+                rows = conn.execute(
+                    f"SELECT {', '.join(SELECT_COLUMNS)} FROM adhd_assessment WHERE id > ?", (high_water_id,)
+                )
+                for row in rows:
+                    for key, delta in self.counters(row_to_record(row)).items():
+                        counts[key] = counts.get(key, 0) + delta
+            conn.execute("DELETE FROM cohort_counters")
+            conn.executemany("INSERT INTO cohort_counters (key, count) VALUES (?, ?)", counts.items())
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def replace_counters(self, counts, high_water_id):
+        await self._run(self._replace_counters, counts, high_water_id)
+
+    def _max_id(self):
+        return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM adhd_assessment").fetchone()[0]
+
+    async def max_id(self):
+        return await self._run(self._max_id)
+
+    def _get(self, row_id):
+        row = self._conn.execute(
+            f"SELECT {', '.join(SELECT_COLUMNS)} FROM adhd_assessment WHERE id = ?", (row_id,)
+        ).fetchone()
+        return row_to_record(row) if row else None
+
+    async def get(self, assessment_id):
+        row_id = parse_assessment_id(assessment_id)
+        if row_id is None:
+            return None
+        return await self._run(self._get, row_id)
+
+    def _count(self, filters):
+        where, params = build_where(filters)
+        return self._conn.execute(f"SELECT COUNT(*) FROM adhd_assessment{where}", params).fetchone()[0]
+
+    async def count(self, filters=None):
+        return await self._run(self._count, filters or {})
+
+    def _score_histogram(self, filters):
+        where, params = build_where(filters)
+        columns = ", ".join(SCORE_COLUMNS.values())
+        rows = self._conn.execute(
+            f"SELECT {columns}, COUNT(*) FROM adhd_assessment{where} GROUP BY {columns}", params
+        ).fetchall()
+        return [(tuple(row[:-1]), row[-1]) for row in rows]
+
+    async def score_histogram(self, filters=None):
+        return await self._run(self._score_histogram, filters or {})
+
+    def _page(self, filters, fields, limit):
+        where, params = build_where(filters)
+        rows = self._conn.execute(
+            f"SELECT {', '.join(select_columns(fields))} FROM adhd_assessment{where} ORDER BY id LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return [row_to_record(row, fields) for row in rows[:limit]], next_cursor
+
+    async def page(self, filters=None, fields=RECORD_FIELDS, limit=100):
+        return await self._run(self._page, filters or {}, tuple(fields), limit)
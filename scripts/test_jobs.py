@@ -0,0 +1,215 @@
+"""Job queue behavior: retries, dead letters, lease renewal and partial SMTP failures.
+
+    python -m pytest -q scripts
+"""
+import asyncio
+import smtplib
+import socket
+import time
+from email.message import EmailMessage
+
+import pytest
+
+import notifications
+from jobs import DEAD, JobQueue, SQLiteJobBackend
+
+
+def make_queue(path, **kwargs):
+    options = {"max_attempts": 3, "backoff_base": 0.0, "poll_interval": 0.01, **kwargs}
+    return JobQueue(SQLiteJobBackend(str(path)), **options)
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not await condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def test_failing_job_is_retried_then_dead_lettered_and_requeued(tmp_path):
+    async def run():
+        queue = make_queue(tmp_path / "jobs.db")
+        calls = []
+        fail = True
+
+        async def handler(jobs):
+            calls.extend(job.attempts for job in jobs)
+            if fail:
+                return {job.id: "550 mailbox parent@example.com unavailable" for job in jobs}
+            return {}
+
+        queue.register("email", handler)
+        await queue.start()
+        try:
+            (job_id,) = await queue.enqueue_many([("email", {"assessment_id": "assessment_1"})])
+
+            async def dead():
+                return bool(await queue.backend.dead_letters())
+            await wait_for(dead)
+
+            (letter,) = await queue.backend.dead_letters()
+            assert letter["id"] == job_id
+            assert letter["attempts"] == 3
+            # Addresses in errors are redacted before they are stored
+            assert "parent@example.com" not in letter["last_error"]
+            assert calls == [1, 2, 3]
+            assert queue.stats[("email", "retried")] == 2
+            assert queue.stats[("email", "dead")] == 1
+
+            fail = False
+            assert await queue.backend.requeue_dead() == 1
+
+            async def drained():
+                depth = await queue.backend.depth()
+                return not any(depth[status] for status in ("queued", "running", DEAD))
+            await wait_for(drained)
+            # Requeued jobs start over with a fresh set of attempts
+            assert calls[-1] == 1
+            assert queue.stats[("email", "succeeded")] == 1
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_leases_are_renewed_while_a_batch_runs(tmp_path):
+    async def run():
+        queue = make_queue(tmp_path / "jobs.db", lease_seconds=0.3)
+        other = SQLiteJobBackend(str(tmp_path / "jobs.db"))
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def handler(jobs):
+            started.set()
+            await release.wait()
+            return {}
+
+        queue.register("slow", handler)
+        await queue.start()
+        await other.open()
+        try:
+            await queue.enqueue("slow", {})
+            await started.wait()
+            await asyncio.sleep(1.0)
+            # Well past the original lease, another worker still cannot claim the job
+            assert await other.claim("slow", 10, 0.3) == []
+        finally:
+            release.set()
+            await other.close()
+            await queue.stop()
+        assert queue.stats == {("slow", "succeeded"): 1}
+
+    asyncio.run(run())
+
+
+class FakeSMTP:
+    """Records delivered messages; fails the way `failures` says on the given message numbers."""
+
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.failures = FakeSMTP.failures
+        FakeSMTP.instances.append(self)
+
+    def ehlo(self):
+        pass
+
+    def has_extn(self, name):
+        return False
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, message):
+        error = self.failures.get(len(self.sent) + 1)
+        if error is not None:
+            self.failures = {}
+            raise error
+        self.sent.append(message["To"])
+
+    def quit(self):
+        raise smtplib.SMTPServerDisconnected("connection already closed")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.failures = {}
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    return FakeSMTP
+
+
+def messages(count):
+    batch = []
+    for job_id in range(1, count + 1):
+        message = EmailMessage()
+        message["To"] = f"parent{job_id}@example.com"
+        batch.append((job_id, message))
+    return batch
+
+
+@pytest.mark.parametrize("error", [
+    socket.timeout("timed out"),
+    ConnectionResetError("reset by peer"),
+    smtplib.SMTPServerDisconnected("gone"),
+    smtplib.SMTPNotSupportedError("no"),
+], ids=lambda error: type(error).__name__)
+def test_broken_connection_fails_only_unsent_messages(fake_smtp, error):
+    fake_smtp.failures = {3: error}
+
+    failures = notifications.send_emails(notifications.SMTPSettings("smtp.test", 25), messages(5))
+
+    (smtp,) = fake_smtp.instances
+    assert smtp.sent == ["parent1@example.com", "parent2@example.com"]
+    assert sorted(failures) == [3, 4, 5]
+    assert smtp.closed
+
+
+def test_refused_recipient_does_not_stop_the_batch(fake_smtp):
+    fake_smtp.failures = {2: smtplib.SMTPRecipientsRefused({"parent2@example.com": (550, b"unknown")})}
+
+    failures = notifications.send_emails(notifications.SMTPSettings("smtp.test", 25), messages(4))
+
+    (smtp,) = fake_smtp.instances
+    assert smtp.sent == ["parent1@example.com", "parent3@example.com", "parent4@example.com"]
+    assert list(failures) == [2]
+
+
+def test_partial_smtp_failure_retries_only_unsent_jobs(tmp_path, fake_smtp):
+    fake_smtp.failures = {3: socket.timeout("timed out")}
+
+    async def run():
+        queue = make_queue(tmp_path / "jobs.db", backoff_base=60.0)
+        settings = notifications.SMTPSettings("smtp.test", 25)
+
+        async def handler(jobs):
+            batch = [(job.id, message) for job, (_, message) in zip(jobs, messages(len(jobs)))]
+            return await asyncio.to_thread(notifications.send_emails, settings, batch)
+
+        queue.register(notifications.REPORT_EMAIL, handler, batch_size=5)
+        await queue.start()
+        try:
+            await queue.enqueue_many([(notifications.REPORT_EMAIL, {"n": n}) for n in range(5)])
+            async def settled():
+                return sum(queue.stats.values()) == 5
+            await wait_for(settled)
+        finally:
+            await queue.stop()
+
+        assert queue.stats == {(notifications.REPORT_EMAIL, "succeeded"): 2, (notifications.REPORT_EMAIL, "retried"): 3}
+        backend = SQLiteJobBackend(str(tmp_path / "jobs.db"))
+        await backend.open()
+        try:
+            assert (await backend.depth())["queued"] == {notifications.REPORT_EMAIL: 3}
+            # The retries wait out their backoff
+            assert await backend.claim(notifications.REPORT_EMAIL, 10, 1.0) == []
+        finally:
+            await backend.close()
+
+    asyncio.run(run())
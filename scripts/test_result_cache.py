@@ -0,0 +1,33 @@
+"""Result cache keying: edited questionnaire definitions never share entries.
+
+    python -m pytest -q scripts
+"""
+from assessment_logic import INSTRUMENT, DevelopmentalScreeningBot, ResultCache, ScreeningInstrument
+
+
+def expected(instrument, responses):
+    bot = DevelopmentalScreeningBot(instrument, cache=None)
+    domain_scores = bot.calculate_domain_scores(responses)
+    return domain_scores, bot.generate_assessment(domain_scores, 5)
+
+
+def test_cache_keeps_edited_definitions_apart():
+    definition = {
+        "questions": dict(INSTRUMENT.questions),
+        "thresholds": dict(zip(INSTRUMENT.domains, INSTRUMENT.threshold_list)),
+        "domains": INSTRUMENT.domains,
+    }
+    edited = dict(definition, thresholds={domain: 1 for domain in INSTRUMENT.domains})
+    original = ScreeningInstrument(INSTRUMENT.version, **definition)
+    changed = ScreeningInstrument(INSTRUMENT.version, **edited)
+    cache = ResultCache(maxsize=16)
+    responses = {INSTRUMENT.question_keys[0]: "2"}
+
+    # Same version and answers, alternating definitions: each keeps its own result
+    for _ in range(3):
+        for instrument in (original, changed):
+            result = DevelopmentalScreeningBot(instrument, cache=cache).assess(responses, 5)
+            assert result == expected(instrument, responses)
+
+    assert cache.stats()["hits"] == 4
+    assert cache.stats()["size"] == 2
@@ -0,0 +1,75 @@
+"""Equivalence checks for the scoring paths.
+
+The batch and cached paths must give exactly what calculate_domain_scores
+followed by generate_assessment gives, for any input those accept.
+
+    python -m pytest -q scripts
+"""
+import random
+
+import numpy as np
+import pytest
+
+from assessment_logic import INSTRUMENT, DevelopmentalScreeningBot, ResultCache
+
+# Canonical answers plus values the per-row path still accepts or skips: ints,
+# padded or zero-prefixed strings, out-of-range, too large for int64 and unparseable values
+ANSWERS = ("", "1", "2", "3", "4", None)
+NON_CANONICAL_ANSWERS = (1, 4, True, " 2", "03", "0", "5", "-1", "2.5", "abc", 7, "99999999999999999999", -2 ** 63)
+
+
+def random_submissions(count, answers, seed=0, density=0.8):
+    rng = random.Random(seed)
+    submissions = []
+    for _ in range(count):
+        responses = {key: rng.choice(answers) for key in INSTRUMENT.question_keys if rng.random() < density}
+        if rng.random() < 0.1:
+            responses["not_a_question"] = "4"
+        submissions.append(responses)
+    return submissions
+
+
+def expected(bot, responses):
+    domain_scores = bot.calculate_domain_scores(responses)
+    return domain_scores, bot.generate_assessment(domain_scores, 5)
+
+
+@pytest.fixture
+def bot():
+    return DevelopmentalScreeningBot(cache=None)
+
+
+@pytest.mark.parametrize("answers", [ANSWERS, ANSWERS + NON_CANONICAL_ANSWERS], ids=["canonical", "non_canonical"])
+def test_batch_matches_per_row(bot, answers):
+    submissions = random_submissions(2000, answers)
+    scores = bot.calculate_domain_scores_batch(submissions)
+
+    assert bot.domain_scores_to_dicts(scores) == [bot.calculate_domain_scores(s) for s in submissions]
+    assert bot.generate_assessments_batch(scores) == [expected(bot, s)[1] for s in submissions]
+
+
+def test_batch_array_input_matches_per_row(bot):
+    submissions = random_submissions(500, ANSWERS)
+    values, _ = bot.encode_responses(submissions)
+
+    assert np.array_equal(bot.calculate_domain_scores_batch(values), bot.calculate_domain_scores_batch(submissions))
+
+
+@pytest.mark.parametrize("answers", [ANSWERS, ANSWERS + NON_CANONICAL_ANSWERS], ids=["canonical", "non_canonical"])
+def test_cached_assess_matches_per_row(bot, answers):
+    cache = ResultCache(maxsize=256)
+    cached_bot = DevelopmentalScreeningBot(cache=cache)
+    # Few distinct vectors, each seen several times, so both misses and hits are checked;
+    # canonical vectors are always included since only those are cacheable
+    submissions = (random_submissions(50, ANSWERS, seed=1) + random_submissions(50, answers, seed=2)) * 5
+
+    for responses in submissions:
+        assert cached_bot.assess(responses, 5) == expected(bot, responses)
+
+    stats = cache.stats()
+    assert stats["hits"] > 0
+    if answers == ANSWERS:
+        assert stats["bypassed"] == 0
+    else:
+        assert stats["bypassed"] > 0
+